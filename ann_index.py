@@ -0,0 +1,213 @@
+"""
+Inverted-file (IVF) index for approximate top-k over normalized TF-IDF rows.
+
+Documents are clustered with spherical k-means on a sample of the corpus.
+Centroids stay sparse by keeping only their heaviest terms, so scoring a
+query against every centroid costs about as much as scoring it against a
+few documents. A query probes its `probes` closest lists, and the documents
+in those lists are re-ranked exactly against the corpus matrix. More probes
+give higher recall at higher latency; probing every list is exact.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from csr_backend import CSRCorpus, SCORE_CHUNK_CELLS, build_csr, np, sparse, is_available
+
+# Terms kept per centroid; the tail of a centroid barely moves its ranking
+CENTROID_TERMS = 256
+# Documents sampled per list when training centroids
+TRAINING_SAMPLE_PER_LIST = 40
+
+
+def default_lists(num_documents: int) -> int:
+    """About 4 * sqrt(N) lists, the usual IVF sizing."""
+    return max(1, int(4 * num_documents ** 0.5))
+
+
+def _assign(matrix, centroids_t) -> "np.ndarray":
+    """Index of the most similar centroid for every row of `matrix`."""
+    num_lists = centroids_t.shape[1]
+    chunk_size = max(1, SCORE_CHUNK_CELLS // max(num_lists, 1))
+    assignment = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], chunk_size):
+        scores = (matrix[start:start + chunk_size] @ centroids_t).toarray()
+        assignment[start:start + chunk_size] = scores.argmax(axis=1)
+    return assignment
+
+
+def _normalize_centroids(sums, max_terms: int):
+    """Keep each row's `max_terms` heaviest terms and scale it to unit length."""
+    sums = sums.tocsr()
+    indptr = [0]
+    indices = []
+    data = []
+    for row in range(sums.shape[0]):
+        start, stop = sums.indptr[row], sums.indptr[row + 1]
+        row_data = sums.data[start:stop]
+        row_indices = sums.indices[start:stop]
+        if row_data.shape[0] > max_terms:
+            keep = np.argpartition(-row_data, max_terms - 1)[:max_terms]
+            row_data, row_indices = row_data[keep], row_indices[keep]
+        norm = np.sqrt((row_data ** 2).sum())
+        if norm > 0:
+            data.append(row_data / norm)
+            indices.append(row_indices)
+        indptr.append(indptr[-1] + (row_data.shape[0] if norm > 0 else 0))
+    return sparse.csr_matrix(
+        (np.concatenate(data) if data else np.empty(0),
+         np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=sums.shape
+    )
+
+
+def train_centroids(matrix, num_lists: int, iterations: int = 10, seed: int = 0,
+                    max_terms: int = CENTROID_TERMS):
+    """Spherical k-means over a sample of the rows of `matrix`; returns a sparse centroid matrix."""
+    rng = np.random.default_rng(seed)
+    num_documents = matrix.shape[0]
+    num_lists = max(1, min(num_lists, num_documents))
+    sample_size = min(num_documents, num_lists * TRAINING_SAMPLE_PER_LIST)
+    sample = matrix[np.sort(rng.choice(num_documents, size=sample_size, replace=False))]
+
+    centroids = sample[rng.choice(sample_size, size=num_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids.T.tocsr())
+        membership = sparse.csr_matrix(
+            (np.ones(sample_size), (assignment, np.arange(sample_size))),
+            shape=(num_lists, sample_size)
+        )
+        centroids = _normalize_centroids(membership @ sample, max_terms)
+
+        # Lists that lost every member restart from a random document
+        empty = np.flatnonzero(np.diff(centroids.indptr) == 0)
+        if empty.shape[0]:
+            centroids = centroids.tolil()
+            for row, source in zip(empty, rng.choice(sample_size, size=empty.shape[0])):
+                centroids[row] = sample[source]
+            centroids = centroids.tocsr()
+    return centroids
+
+
+def align_centroids(centroids, terms: List[str], term_columns: Dict[str, int]):
+    """
+    Move centroid weights from the columns of `terms` to those of `term_columns`,
+    dropping terms the corpus no longer has, so centroids survive vocabulary changes.
+    """
+    columns = np.asarray([term_columns.get(term, -1) for term in terms], dtype=np.int64)
+    coo = centroids.tocoo()
+    mapped = columns[coo.col]
+    keep = mapped >= 0
+    return sparse.csr_matrix(
+        (coo.data[keep], (coo.row[keep], mapped[keep])),
+        shape=(centroids.shape[0], len(term_columns))
+    )
+
+
+class IVFIndex:
+    """
+    Documents of a corpus matrix grouped by their closest centroid.
+    Centroids can be reused across corpus versions; only the cheap
+    assignment step runs again.
+    """
+
+    def __init__(self, centroids, matrix, assignment: Optional["np.ndarray"] = None):
+        """
+        `assignment` holds the list of each row already assigned to these
+        centroids, or -1 for rows to assign; by default every row is assigned.
+        """
+        if not is_available():
+            raise ImportError("Approximate retrieval requires numpy and scipy to be installed")
+
+        self.centroids = centroids
+        # Terms as rows, so a query only touches the centroids sharing its terms
+        self.centroids_t = centroids.T.tocsr()
+        self.matrix = matrix
+        if assignment is None:
+            assignment = _assign(matrix, self.centroids_t)
+        else:
+            stale = np.flatnonzero(assignment < 0)
+            if stale.shape[0]:
+                assignment = assignment.copy()
+                assignment[stale] = _assign(matrix[stale], self.centroids_t)
+        # List of every row, kept so the next corpus version only assigns its changed rows
+        self.assignment = assignment
+        # Rows grouped by list, each list in corpus order
+        self.rows = np.argsort(assignment, kind="stable")
+        self.offsets = np.searchsorted(assignment[self.rows], np.arange(centroids.shape[0] + 1))
+
+    @property
+    def num_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def candidates(self, centroid_scores: "np.ndarray", probes: int) -> "np.ndarray":
+        """Sorted rows of the `probes` lists closest to a query."""
+        if probes >= self.num_lists:
+            lists = np.arange(self.num_lists)
+        else:
+            lists = np.argpartition(-centroid_scores, probes - 1)[:probes]
+        return self._rows_of(lists)
+
+    def filtered_candidates(self, centroid_scores: "np.ndarray", selected: "np.ndarray",
+                            list_counts: "np.ndarray", wanted: int) -> "np.ndarray":
+        """
+        Sorted selected rows of the lists closest to a query, probing lists in
+        score order until at least `wanted` selected rows are collected.
+        `selected` flags every corpus row and `list_counts` counts them per list.
+        """
+        order = np.argsort(-centroid_scores, kind="stable")
+        reached = np.cumsum(list_counts[order])
+        lists = order[:int(np.searchsorted(reached, wanted)) + 1]
+        rows = self._rows_of(lists)
+        return rows[selected[rows]]
+
+    def _rows_of(self, lists: "np.ndarray") -> "np.ndarray":
+        parts = [self.rows[self.offsets[index]:self.offsets[index + 1]] for index in lists]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def top_k(self, user_vectors: List[Dict[str, float]], term_columns: Dict[str, int], limit: int,
+              probes: int, rows: Optional["np.ndarray"] = None,
+              timings: Optional[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Approximate top `limit` rows per user vector, optionally restricted
+        to the sorted rows in `rows`. Candidates are scored exactly, so the
+        returned scores are true cosine similarities. A filtered query keeps
+        probing lists in score order until it has collected as many rows of
+        `rows` as `probes` lists hold on average, and at least `limit`; a
+        filter no larger than that is scored whole, which is exact.
+        """
+        started = time.perf_counter()
+        users = build_csr(user_vectors, term_columns)
+        centroid_scores = (users @ self.centroids_t).toarray()
+        if rows is not None:
+            num_documents = self.matrix.shape[0]
+            # As many candidates as `probes` lists hold on average, so filtering costs no extra scoring
+            wanted = max(limit, probes * num_documents // self.num_lists)
+            whole = rows.shape[0] <= wanted
+            if not whole:
+                selected = np.zeros(num_documents, dtype=bool)
+                selected[rows] = True
+                in_lists = np.concatenate(([0], np.cumsum(selected[self.rows])))
+                list_counts = in_lists[self.offsets[1:]] - in_lists[self.offsets[:-1]]
+        probed = time.perf_counter()
+
+        results = []
+        for user, scores in enumerate(centroid_scores):
+            if rows is None:
+                candidates = self.candidates(scores, probes)
+            elif whole:
+                candidates = rows
+            else:
+                # Only probing `probes` lists would leave a narrow filter few candidates
+                candidates = self.filtered_candidates(scores, selected, list_counts, wanted)
+            if candidates.shape[0] == 0 or limit <= 0:
+                results.append([])
+                continue
+            exact = (users[user] @ self.matrix[candidates].T).toarray()[0]
+            ranked = CSRCorpus._select(exact, min(limit, candidates.shape[0]))
+            results.append([(int(candidates[position]), score) for position, score in ranked])
+
+        if timings is not None:
+            timings['ann_probe'] = timings.get('ann_probe', 0.0) + probed - started
+            timings['scoring'] = timings.get('scoring', 0.0) + time.perf_counter() - probed
+        return results
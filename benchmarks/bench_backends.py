@@ -0,0 +1,51 @@
+"""
+Compare the python and csr scoring backends for batches of user profiles.
+Fails if the two backends disagree on the ranked event ids or their scores.
+
+Usage:
+    python -m benchmarks.bench_backends [--sizes 1000,10000,100000] [--users 1000]
+"""
+import argparse
+import time
+
+from benchmarks.bench_scoring import make_catalog
+from recommendation_engine import TFIDFRecommendationEngine
+
+# Both backends score float32 weights, accumulated in different orders and precisions
+SCORE_TOLERANCE = 1e-6
+
+
+def check_parity(expected, actual):
+    for dense, vectorized in zip(expected, actual):
+        assert [event_id for event_id, _ in dense] == [event_id for event_id, _ in vectorized]
+        for (_, expected_score), (_, actual_score) in zip(dense, vectorized):
+            assert abs(expected_score - actual_score) < SCORE_TOLERANCE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        documents, profiles = make_catalog(size)
+        profiles = (profiles * (args.users // len(profiles) + 1))[:args.users]
+        event_ids = list(range(1, size + 1))
+        print(f"{size} events, {len(profiles)} users")
+
+        results = {}
+        for backend in ("python", "csr"):
+            engine = TFIDFRecommendationEngine(backend=backend)
+            engine.fit(documents, event_ids)
+            start = time.perf_counter()
+            results[backend] = engine.get_batch_recommendations(profiles, args.limit)
+            elapsed = time.perf_counter() - start
+            print(f"  {backend:<7} {elapsed:8.3f} s   {len(profiles) / elapsed:10.1f} users/s")
+
+        check_parity(results["python"], results["csr"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark exhaustive vs inverted-index scoring on a synthetic event catalog.
+
+Usage:
+    python -m benchmarks.bench_scoring [--sizes 1000,10000,100000] [--queries 50]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from recommendation_engine import TFIDFRecommendationEngine
+
+WORDS = [f"term{chr(97 + i // 26)}{chr(97 + i % 26)}" for i in range(26 * 26)]
+CATEGORIES = ["technology", "music", "sports", "food", "art", "business", "travel", "education"]
+
+# The exhaustive path is O(events x vocabulary) per query; skip it above this size
+DENSE_MAX_EVENTS = 10000
+# Indexed weights are stored as float32, so scores agree with the float64 path to about this much
+SCORE_TOLERANCE = 1e-6
+
+
+def make_catalog(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(size):
+        title = ' '.join(rng.choices(WORDS, k=4))
+        description = ' '.join(rng.choices(WORDS, k=20))
+        category = rng.choice(CATEGORIES)
+        documents.append(f"{title} {description} {category}")
+    profiles = [' '.join(rng.choices(WORDS + CATEGORIES, k=6)) for _ in range(200)]
+    return documents, profiles
+
+
+def time_queries(fn, profiles):
+    latencies = []
+    results = []
+    for profile in profiles:
+        start = time.perf_counter()
+        results.append(fn(profile))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<8} median {statistics.median(latencies):9.3f} ms   p99 {p99:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        documents, profiles = make_catalog(size)
+        profiles = profiles[:args.queries]
+        event_ids = list(range(1, size + 1))
+
+        engine = TFIDFRecommendationEngine()
+        start = time.perf_counter()
+        engine.fit(documents, event_ids)
+        fit_seconds = time.perf_counter() - start
+        print(f"{size} events, vocabulary {len(engine.vocabulary)}, fit {fit_seconds:.2f} s")
+
+        indexed_latencies, indexed_results = time_queries(
+            lambda profile: engine.get_indexed_recommendations(profile, args.limit), profiles)
+        report("indexed", indexed_latencies)
+
+        if size > DENSE_MAX_EVENTS:
+            continue
+
+        # Fewer exhaustive queries keep the run short; they are compared for parity too
+        dense_profiles = profiles[:5]
+        dense_latencies, dense_results = time_queries(
+            lambda profile: engine.get_recommendations(profile, documents, event_ids, args.limit),
+            dense_profiles)
+        report("dense", dense_latencies)
+
+        for dense, indexed in zip(dense_results, indexed_results):
+            assert [event_id for event_id, _ in dense] == [event_id for event_id, _ in indexed]
+            for (_, expected), (_, actual) in zip(dense, indexed):
+                assert abs(expected - actual) < SCORE_TOLERANCE
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Reproducible benchmark suite over a seeded synthetic catalog, reported as JSON.
+
+Each scale runs in a fresh interpreter so peak RSS is per scale. Measured:
+engine fit time, per-query latency of the engine and of RecommendationService
+(against an in-memory database, cache disabled by distinct users), batch
+throughput, and optionally the FastAPI endpoints.
+
+Usage:
+    python -m benchmarks.bench_suite [--sizes 1000,10000,100000,1000000] [--queries 200]
+        [--batch-users 1000] [--backend python|csr] [--api] [--output run.json]
+
+Compare two runs with `python -m benchmarks.compare old.json new.json`.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import SyntheticCatalog, InMemoryDatabase
+
+SCHEMA_VERSION = 1
+
+
+def percentiles(latencies_ms):
+    latencies = sorted(latencies_ms)
+    if not latencies:
+        return {}
+
+    def pick(fraction):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 4)
+
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": round(latencies[-1], 4),
+    }
+
+
+def time_calls(fn, arguments):
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        fn(argument)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(size, args):
+    """Benchmark one catalog size in this process and return its result dict."""
+    # Configuration is read at import, so it is set before the service is imported
+    os.environ["RECOMMENDER_BACKEND"] = args.backend
+    os.environ["MODEL_ARTIFACT_DIR"] = ""
+    os.environ["MODEL_REFRESH_INTERVAL_SECONDS"] = "0"
+    from recommendation_engine import TFIDFRecommendationEngine
+    from recommendation_service import RecommendationService
+
+    catalog = SyntheticCatalog(seed=args.seed)
+    user_count = max(args.queries, args.batch_users)
+    users = catalog.users(user_count)
+    result = {"size": size, "backend": args.backend}
+
+    # Engine fit straight from the generator, as the service streams rows
+    engine = TFIDFRecommendationEngine(backend=args.backend)
+    start = time.perf_counter()
+    engine.fit_records(
+        (event["id"], f"{event['title']} {event['description']} {event['category_name']}".lower(),
+         event["category_name"])
+        for event in catalog.iter_events(size)
+    )
+    result["fit_seconds"] = round(time.perf_counter() - start, 4)
+    result["vocabulary_size"] = len(engine.vocabulary)
+
+    query_users = list(users)[:args.queries]
+    profiles = [users[user_id] for user_id in query_users]
+    result["engine_query"] = time_calls(
+        lambda profile: engine.get_indexed_recommendations(profile, args.limit), profiles)
+    del engine
+
+    # Service over an in-memory database; each user is queried once, so every call misses the caches
+    database = InMemoryDatabase(catalog.events(size), users)
+    start = time.perf_counter()
+    service = RecommendationService(db=database)
+    result["service_fit_seconds"] = round(time.perf_counter() - start, 4)
+    result["service_query"] = time_calls(
+        lambda user_id: service.get_user_recommendations(user_id, args.limit), query_users)
+
+    batch_ids = list(users)[:args.batch_users]
+    service._cache.clear()
+    service._profiles.clear()
+    start = time.perf_counter()
+    for offset in range(0, len(batch_ids), args.batch_size):
+        service.get_batch_user_recommendations(batch_ids[offset:offset + args.batch_size], args.limit)
+    elapsed = time.perf_counter() - start
+    result["batch"] = {
+        "users": len(batch_ids),
+        "batch_size": args.batch_size,
+        "seconds": round(elapsed, 4),
+        "users_per_second": round(len(batch_ids) / elapsed, 1) if elapsed else None,
+    }
+
+    if args.api:
+        result["api"] = run_api(service, query_users, args.limit)
+
+    service.close()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_api(service, user_ids, limit):
+    """Time the FastAPI endpoints in-process through TestClient (needs httpx)."""
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError as e:
+        return {"skipped": f"fastapi TestClient unavailable: {e}"}
+    import main
+
+    main.recommendation_service = service
+    client = TestClient(main.app)
+    service._cache.clear()
+    service._profiles.clear()
+    single = time_calls(lambda user_id: client.get(f"/recommend/{user_id}", params={"limit": limit}), user_ids)
+    batch = time_calls(
+        lambda chunk: client.post("/recommend/batch", json={"user_ids": chunk, "limit": limit}),
+        [user_ids[i:i + 50] for i in range(0, len(user_ids), 50)]
+    )
+    return {"get_recommend": single, "post_recommend_batch": batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)  # one scale, used by child processes
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-users", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", default="python", choices=("python", "csr"))
+    parser.add_argument("--api", action="store_true", help="also time the FastAPI endpoints")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        json.dump(run_scale(args.size, args), sys.stdout)
+        return
+
+    child_args = [
+        "--queries", str(args.queries), "--batch-users", str(args.batch_users),
+        "--batch-size", str(args.batch_size), "--limit", str(args.limit),
+        "--seed", str(args.seed), "--backend", args.backend,
+    ] + (["--api"] if args.api else [])
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"benchmarking {size} events...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_suite", "--size", str(size)] + child_args,
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            sys.stderr.write(child.stderr)
+            results.append({"size": size, "error": child.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {
+            "seed": args.seed, "queries": args.queries, "batch_users": args.batch_users,
+            "batch_size": args.batch_size, "limit": args.limit, "backend": args.backend,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
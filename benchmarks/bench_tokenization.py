@@ -0,0 +1,44 @@
+"""
+Time tokenization-heavy steps of model fitting on a synthetic corpus:
+TextProcessor.get_vocabulary / get_document_frequency,
+TFIDFRecommendationEngine.calculate_idf and TFIDFRecommendationEngine.fit.
+Run on two commits to compare them.
+
+Usage:
+    python -m benchmarks.bench_tokenization [--sizes 10000,100000] [--df-max 2000]
+"""
+import argparse
+import time
+
+from benchmarks.bench_scoring import make_catalog
+from recommendation_engine import TFIDFRecommendationEngine
+from utils.text_processing import TextProcessor
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    print(f"  {label:<24} {time.perf_counter() - start:8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--df-max", type=int, default=2000,
+                        help="largest corpus for get_document_frequency")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        documents, _ = make_catalog(size)
+        print(f"{size} documents")
+
+        processor = TextProcessor()
+        timed("get_vocabulary", lambda: processor.get_vocabulary(documents))
+        if size <= args.df_max:
+            timed("get_document_frequency", lambda: processor.get_document_frequency(documents))
+        timed("calculate_idf", lambda: TFIDFRecommendationEngine().calculate_idf(documents))
+        timed("fit", lambda: TFIDFRecommendationEngine().fit(documents))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare two bench_suite JSON reports, e.g. from two commits.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10]
+
+Prints old and new values per size and metric with the relative change, and
+exits with status 1 when any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# (path into a result, True when larger is better)
+METRICS = [
+    (("fit_seconds",), False),
+    (("service_fit_seconds",), False),
+    (("engine_query", "p50_ms"), False),
+    (("engine_query", "p99_ms"), False),
+    (("service_query", "p50_ms"), False),
+    (("service_query", "p99_ms"), False),
+    (("batch", "users_per_second"), True),
+    (("api", "get_recommend", "p50_ms"), False),
+    (("api", "get_recommend", "p99_ms"), False),
+    (("peak_rss_mb",), False),
+]
+
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline.get('commit')}  {baseline.get('timestamp')}")
+    print(f"candidate {candidate.get('commit')}  {candidate.get('timestamp')}")
+    if baseline.get("parameters") != candidate.get("parameters"):
+        print("warning: runs used different parameters", baseline.get("parameters"), candidate.get("parameters"))
+
+    old_results = {result["size"]: result for result in baseline["results"]}
+    regressions = 0
+    for new in candidate["results"]:
+        old = old_results.get(new["size"])
+        if old is None:
+            continue
+        print(f"\n{new['size']} events")
+        for path, higher_is_better in METRICS:
+            before, after = lookup(old, path), lookup(new, path)
+            if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or before == 0:
+                continue
+            change = (after - before) / before
+            regressed = (change < -args.threshold) if higher_is_better else (change > args.threshold)
+            regressions += regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {'.'.join(path):<28} {before:>12.4f} -> {after:>12.4f}  {change:+7.1%}{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
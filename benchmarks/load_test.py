@@ -0,0 +1,58 @@
+"""
+Concurrent load test for the recommendation API.
+Runs against a live server and reports throughput and latency percentiles,
+so runs before and after a change can be compared at the same concurrency.
+
+Usage:
+    python -m benchmarks.load_test --url http://localhost:8000 --users 1,2,3 \
+        [--concurrency 32] [--requests 1000] [--limit 10]
+"""
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url: str):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", default="1", help="comma-separated user ids to cycle through")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    user_ids = [int(user_id) for user_id in args.users.split(",")]
+    urls = [
+        f"{args.url.rstrip('/')}/recommend/{user_ids[i % len(user_ids)]}?limit={args.limit}"
+        for i in range(args.requests)
+    ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    failures = sum(1 for ok, _ in results if not ok)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {failures} failed")
+    print(f"throughput {args.requests / elapsed:10.1f} req/s")
+    print(f"latency    median {statistics.median(latencies):.1f} ms   p99 {p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
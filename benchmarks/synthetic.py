@@ -0,0 +1,111 @@
+"""
+Seeded synthetic events and users, plus an in-memory DatabaseOperations stand-in.
+
+Words follow a Zipf-like distribution so term frequencies and posting-list
+lengths resemble real text: a few very common terms and a long tail.
+The same seed and sizes always produce the same catalog and users.
+"""
+import random
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CATEGORIES = ["technology", "music", "sports", "food", "art", "business", "travel", "education",
+              "health", "film", "gaming", "science", "fashion", "outdoors", "charity", "community"]
+
+DEFAULT_VOCABULARY_SIZE = 20000
+
+
+def make_words(count: int) -> List[str]:
+    """Distinct alphabetic pseudo-words; the tokenizer drops digits and short tokens."""
+    words = []
+    for i in range(count):
+        word = ""
+        n = i
+        while True:
+            word += chr(97 + n % 26)
+            n //= 26
+            if n == 0:
+                break
+        words.append("w" + word + "x")
+    return words
+
+
+class SyntheticCatalog:
+    """Generator for events and user interests drawn from one seeded vocabulary."""
+
+    def __init__(self, seed: int = 42, vocabulary_size: int = DEFAULT_VOCABULARY_SIZE):
+        self.seed = seed
+        self.words = make_words(vocabulary_size)
+        self._cumulative = list(accumulate(1.0 / rank for rank in range(1, vocabulary_size + 1)))
+
+    def _words(self, rng: random.Random, count: int) -> str:
+        return " ".join(rng.choices(self.words, cum_weights=self._cumulative, k=count))
+
+    def iter_events(self, size: int) -> Iterator[Dict]:
+        """Yield `size` event rows shaped like DatabaseOperations.get_all_events() rows."""
+        rng = random.Random(self.seed)
+        for event_id in range(1, size + 1):
+            yield {
+                "id": event_id,
+                "title": self._words(rng, rng.randint(3, 8)).title(),
+                "description": self._words(rng, rng.randint(15, 60)),
+                "category_name": rng.choice(CATEGORIES),
+            }
+
+    def events(self, size: int) -> List[Dict]:
+        return list(self.iter_events(size))
+
+    def users(self, count: int) -> Dict[int, str]:
+        """Interests keyed by user id: a few categories plus popular and long-tail words."""
+        rng = random.Random(self.seed + 1)
+        users = {}
+        for user_id in range(1, count + 1):
+            interests = rng.sample(CATEGORIES, rng.randint(1, 3))
+            users[user_id] = " ".join(interests) + " " + self._words(rng, rng.randint(2, 10))
+        return users
+
+
+class InMemoryDatabase:
+    """
+    Stand-in for DatabaseOperations over generated rows, so the service can
+    be benchmarked without PostgreSQL.
+    """
+
+    def __init__(self, events: List[Dict], users: Dict[int, str]):
+        self.events = events
+        self.users = users
+        # Bumped on every write, standing in for the table fingerprint
+        self._writes = 0
+
+    def get_user_interests(self, user_id: int) -> Optional[str]:
+        return self.users.get(user_id)
+
+    def get_users_interests(self, user_ids: List[int]) -> Dict[int, str]:
+        return {user_id: self.users[user_id] for user_id in user_ids if user_id in self.users}
+
+    def iter_users_interests(self, batch_size: int = 2000) -> Iterator[Tuple[int, Optional[str]]]:
+        return iter(list(self.users.items()))
+
+    def get_all_events(self) -> List[Dict]:
+        return [dict(event) for event in self.events]
+
+    def iter_events(self, batch_size: int = 2000) -> Iterator[Dict]:
+        for event in self.events:
+            yield dict(event)
+
+    def get_events_watermark(self) -> str:
+        return f"{len(self.events)}:{self.events[-1]['id'] if self.events else 0}:{self._writes}"
+
+    def get_events_by_category(self, category_name: str) -> List[Dict]:
+        return [dict(event) for event in self.events if event["category_name"] == category_name]
+
+    def create_event(self, title: str, description: str, category_name: str) -> int:
+        event_id = (self.events[-1]["id"] if self.events else 0) + 1
+        self.events.append({"id": event_id, "title": title, "description": description,
+                            "category_name": category_name})
+        self._writes += 1
+        return event_id
+
+    def create_events(self, events: List[Dict]) -> List[int]:
+        return [self.create_event(event["title"], event["description"], event["category_name"])
+                for event in events]
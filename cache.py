@@ -0,0 +1,182 @@
+"""
+Cache backends for per-user recommendation state.
+
+LocalCache is a bounded in-process LRU with TTL and is the default.
+RedisCache shares entries between workers when a CACHE_URL is configured
+and the optional `redis` package is installed; both expose the same API.
+RedisCache stores JSON, never pickles: anyone able to write to a shared
+server could otherwise run code in every worker.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+try:
+    import redis
+except ImportError:  # only needed for a shared cache
+    redis = None
+
+
+class LocalCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss/eviction counters."""
+    # Calls never wait on I/O, so async callers may make them on the event loop
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "local",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class RedisCache:
+    """
+    Cache shared between workers through Redis; eviction is left to Redis' maxmemory policy.
+    Values are stored as JSON; `encode` and `decode` convert values that are
+    not JSON-compatible as they are.
+    """
+    # Every call is a network round trip; async callers run them on a thread pool
+    blocking = True
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str = "recommender:",
+                 encode: Optional[Callable[[Any], Any]] = None, decode: Optional[Callable[[Any], Any]] = None):
+        if redis is None:
+            raise ImportError("A shared cache requires the redis package to be installed")
+        self._client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._encode = encode or _identity
+        self._decode = decode or _identity
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            payload = self._client.get(self.prefix + key)
+        except redis.RedisError as e:
+            logging.warning(f"Cache read failed: {e}")
+            self._count("errors")
+            payload = None
+        if payload is None:
+            self._count("misses")
+            return None
+        try:
+            value = self._decode(json.loads(payload))
+        except (ValueError, KeyError, TypeError) as e:
+            # Written by another version or not by us at all; treated as a miss
+            logging.warning(f"Ignoring unreadable cache entry: {e}")
+            self._count("errors")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: Any):
+        try:
+            payload = json.dumps(self._encode(value))
+            self._client.set(self.prefix + key, payload, px=int(self.ttl_seconds * 1000))
+        except redis.RedisError as e:
+            logging.warning(f"Cache write failed: {e}")
+            self._count("errors")
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self.prefix + key)
+        except redis.RedisError as e:
+            logging.warning(f"Cache delete failed: {e}")
+            self._count("errors")
+
+    def clear(self):
+        try:
+            keys = list(self._client.scan_iter(match=self.prefix + "*"))
+            if keys:
+                self._client.delete(*keys)
+        except redis.RedisError as e:
+            logging.warning(f"Cache clear failed: {e}")
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+            }
+
+
+def create_cache(url: str, max_entries: int, ttl_seconds: float, prefix: str = "recommender:",
+                 encode: Optional[Callable[[Any], Any]] = None, decode: Optional[Callable[[Any], Any]] = None):
+    """
+    Use Redis when a URL is configured and the client is installed, else an in-process cache.
+    Caches sharing a Redis server need distinct key prefixes, since clear() drops the whole prefix.
+    `encode`/`decode` map values to and from JSON for Redis; the in-process cache keeps objects as they are.
+    """
+    if url:
+        if redis is not None:
+            return RedisCache(url, ttl_seconds, prefix, encode, decode)
+        logging.warning("CACHE_URL is set but redis is not installed; using the in-process cache")
+    return LocalCache(max_entries, ttl_seconds)
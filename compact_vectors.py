@@ -0,0 +1,76 @@
+"""
+Compact storage for the fitted TF-IDF state of the python engine.
+
+Terms are interned once into a TermTable and documents refer to them by
+integer id. Per-document vectors and inverted-index postings keep only their
+non-zero entries in typed `array` buffers (uint32 term ids, float32 weights),
+which costs a few bytes per entry instead of a boxed float plus a dict slot.
+"""
+from array import array
+from typing import Dict, List, NamedTuple, Optional
+
+
+class SparseVector(NamedTuple):
+    """Non-zero entries of a document vector as parallel term id and weight buffers."""
+    term_ids: array
+    weights: array
+
+
+class Postings(NamedTuple):
+    """Documents containing one term, as parallel event id and weight buffers."""
+    event_ids: array
+    weights: array
+
+    def with_entry(self, event_id: int, weight: float) -> "Postings":
+        """A copy with one more document; the original is left untouched for readers."""
+        return Postings(self.event_ids + array('q', (event_id,)), self.weights + array('f', (weight,)))
+
+    def without(self, event_id: int) -> Optional["Postings"]:
+        """A copy without `event_id`, or None when no document is left."""
+        position = self.event_ids.index(event_id)
+        if len(self.event_ids) == 1:
+            return None
+        return Postings(
+            self.event_ids[:position] + self.event_ids[position + 1:],
+            self.weights[:position] + self.weights[position + 1:]
+        )
+
+
+def new_postings() -> Postings:
+    return Postings(array('q'), array('f'))
+
+
+def empty_vector() -> SparseVector:
+    return SparseVector(array('I'), array('f'))
+
+
+class TermTable:
+    """
+    Append-only mapping between terms and dense integer ids.
+    Ids are never reused, so vectors stay valid while terms come and go;
+    a full fit starts a new table.
+    """
+
+    def __init__(self, terms: Optional[List[str]] = None):
+        self.terms: List[str] = list(terms or ())
+        self.ids: Dict[str, int] = {term: term_id for term_id, term in enumerate(self.terms)}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def intern(self, term: str) -> int:
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def get(self, term: str) -> Optional[int]:
+        return self.ids.get(term)
+
+    def copy(self) -> "TermTable":
+        clone = TermTable.__new__(TermTable)
+        clone.terms = list(self.terms)
+        clone.ids = dict(self.ids)
+        return clone
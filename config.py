@@ -0,0 +1,77 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Scoring backend for TFIDFRecommendationEngine: "python" or "csr" (needs numpy/scipy)
+RECOMMENDER_BACKEND = os.getenv("RECOMMENDER_BACKEND", "python")
+
+# Fraction of the corpus that may change through incremental updates before IDF
+# is recomputed; an empty value disables automatic recomputation
+_idf_drift_threshold = os.getenv("IDF_DRIFT_THRESHOLD", "0.1")
+IDF_DRIFT_THRESHOLD = float(_idf_drift_threshold) if _idf_drift_threshold else None
+
+# Weight of each event field in its document vector, as "field:weight" pairs.
+# Changing them invalidates persisted model artifacts
+DOCUMENT_FIELD_WEIGHTS = {
+    field.strip(): float(weight)
+    for field, weight in (
+        pair.split(":") for pair in
+        os.getenv("DOCUMENT_FIELD_WEIGHTS", "title:1,description:1,category:1").split(",") if pair.strip()
+    )
+}
+
+# Threads scoring requests from the async API path, i.e. the scoring concurrency limit
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Uncached recommendation requests admitted at once, running or queued for the
+# database and scoring pools; further ones get a 503 right away. 0 admits all
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", str(SCORING_WORKERS * 16)))
+# Most users one batch recommendation request may carry; a batch counts as one admission
+MAX_BATCH_USERS = int(os.getenv("MAX_BATCH_USERS", "500"))
+
+# Directory of the persisted model artifact shared by workers; empty disables it
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", "")
+
+# Per-user recommendation cache; CACHE_URL (redis://...) shares it between workers
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+# Tokenized and weighted user interest vectors, kept across model versions and
+# shared through CACHE_URL when set. Interests are read again after the TTL or
+# once invalidate_user() reports a change
+USER_PROFILE_MAX_ENTRIES = int(os.getenv("USER_PROFILE_MAX_ENTRIES", "100000"))
+USER_PROFILE_TTL_SECONDS = float(os.getenv("USER_PROFILE_TTL_SECONDS", "86400"))
+# Load every user's interests with one query at startup instead of on first request
+PRECOMPUTE_USER_PROFILES = os.getenv("PRECOMPUTE_USER_PROFILES", "").lower() in ("1", "true", "yes")
+
+# Rows fetched per round trip when streaming the events table into a fit
+EVENTS_FETCH_SIZE = int(os.getenv("EVENTS_FETCH_SIZE", "2000"))
+# Rows per multi-row INSERT statement in bulk event ingestion, and the most
+# events one bulk request may carry
+INGEST_PAGE_SIZE = int(os.getenv("INGEST_PAGE_SIZE", "1000"))
+MAX_BULK_EVENTS = int(os.getenv("MAX_BULK_EVENTS", "10000"))
+
+# Seconds between background checks for changed events; 0 disables the refresher
+MODEL_REFRESH_INTERVAL_SECONDS = float(os.getenv("MODEL_REFRESH_INTERVAL_SECONDS", "300"))
+
+# Timestamp column bumped on every event write; when set, change detection
+# reads count/max(id)/max(column) instead of hashing every row
+EVENTS_UPDATED_AT_COLUMN = os.getenv("EVENTS_UPDATED_AT_COLUMN", "")
+
+# Worker processes for sharded scoring of large catalogs (needs numpy/scipy); 0 or 1 disables it
+SCORING_PROCESSES = int(os.getenv("SCORING_PROCESSES", "0"))
+# Catalogs smaller than this are scored in-process, where IPC would cost more than it saves
+SHARDED_MIN_EVENTS = int(os.getenv("SHARDED_MIN_EVENTS", "100000"))
+# Where model versions are exported for the scoring processes; empty uses the temp directory
+SHARD_DIR = os.getenv("SHARD_DIR", "")
+# Seconds a model version must stay current before it is exported, so a stream of
+# incremental updates does not start a full export per event
+SHARD_EXPORT_MIN_AGE_SECONDS = float(os.getenv("SHARD_EXPORT_MIN_AGE_SECONDS", "30"))
+
+# IVF lists probed per query for approximate retrieval (csr backend only); 0 keeps exact ranking.
+# More probes raise recall and latency; probing every list is exact
+ANN_PROBES = int(os.getenv("ANN_PROBES", "0"))
+# Number of IVF lists; empty sizes them as about 4 * sqrt(number of events)
+_ann_lists = os.getenv("ANN_LISTS", "")
+ANN_LISTS = int(_ann_lists) if _ann_lists else None
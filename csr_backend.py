@@ -0,0 +1,153 @@
+
+import time
+from array import array
+from typing import List, Dict, Sequence, Tuple, Optional
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # numpy/scipy are only needed for the "csr" backend
+    np = None
+    sparse = None
+
+# Upper bound on dense score cells (users x events) materialized per chunk
+SCORE_CHUNK_CELLS = 1 << 24
+
+
+def is_available() -> bool:
+    """Check whether numpy and scipy can be imported."""
+    return np is not None and sparse is not None
+
+
+def build_csr(vectors: List[Dict[str, float]], term_columns: Dict[str, int]):
+    """Build a CSR matrix with one row per sparse vector, dropping terms without a column."""
+    indptr = [0]
+    indices = []
+    data = []
+    for vector in vectors:
+        for term, weight in vector.items():
+            column = term_columns.get(term)
+            if column is not None:
+                indices.append(column)
+                data.append(weight)
+        indptr.append(len(indices))
+
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64),
+         np.asarray(indices, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=(len(vectors), len(term_columns))
+    )
+
+
+def build_csr_from_buffers(rows: Sequence[Tuple[array, array]], num_columns: int):
+    """
+    Build a CSR matrix from per-row (column ids array('I'), weights array('f'))
+    pairs, such as the engine's compact document vectors.
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indices = array('I')
+    data = array('f')
+    for position, (columns, weights) in enumerate(rows, 1):
+        indices.extend(columns)
+        data.extend(weights)
+        indptr[position] = len(indices)
+
+    return sparse.csr_matrix(
+        (np.frombuffer(data, dtype=np.float32).astype(np.float64),
+         np.frombuffer(indices, dtype=np.uint32).astype(np.int32),
+         indptr),
+        shape=(len(rows), num_columns)
+    )
+
+
+class CSRCorpus:
+    """
+    Fitted corpus stored as a CSR matrix of L2-normalized TF-IDF rows.
+    Each term owns a fixed column, so a batch of user vectors can be scored
+    against every event with a single sparse matrix product.
+    """
+
+    def __init__(self, normalized_vectors: List[Dict[str, float]], terms: Optional[List[str]] = None):
+        if not is_available():
+            raise ImportError("The csr backend requires numpy and scipy to be installed")
+
+        if terms is None:
+            terms = sorted({term for vector in normalized_vectors for term in vector})
+        self.term_columns = {term: column for column, term in enumerate(terms)}
+        self.matrix = self.vectorize(normalized_vectors)
+        # Transposed copy so user rows multiply against term rows directly
+        self.matrix_t = self.matrix.T.tocsr()
+
+    @classmethod
+    def from_matrices(cls, term_columns: Dict[str, int], matrix, matrix_t) -> "CSRCorpus":
+        """Wrap prebuilt (e.g. memory-mapped) matrices without copying them."""
+        corpus = cls.__new__(cls)
+        corpus.term_columns = term_columns
+        corpus.matrix = matrix
+        corpus.matrix_t = matrix_t
+        return corpus
+
+    @property
+    def num_documents(self) -> int:
+        return self.matrix.shape[0]
+
+    def vectorize(self, vectors: List[Dict[str, float]]):
+        """Build a CSR matrix with one row per sparse vector, dropping unknown terms."""
+        return build_csr(vectors, self.term_columns)
+
+    def top_k(self, user_vectors: List[Dict[str, float]], limit: int,
+              rows: Optional["np.ndarray"] = None,
+              timings: Optional[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Score normalized user vectors against the corpus, or only against the
+        sorted document positions in `rows`.
+        Returns one list of (document position, score) tuples per user, ordered
+        by score and then by position. Seconds spent in the matrix product and
+        in top-k selection are added to `timings` under "scoring" and "top_k".
+        """
+        num_documents = self.num_documents if rows is None else rows.shape[0]
+        if not user_vectors or limit <= 0 or num_documents == 0:
+            return [[] for _ in user_vectors]
+
+        limit = min(limit, num_documents)
+        chunk_size = max(1, SCORE_CHUNK_CELLS // self.num_documents)
+
+        results = []
+        scoring = selecting = 0.0
+        for start in range(0, len(user_vectors), chunk_size):
+            started = time.perf_counter()
+            users = self.vectorize(user_vectors[start:start + chunk_size])
+            scores = (users @ self.matrix_t).toarray()
+            if rows is not None:
+                # Scoring the whole corpus and keeping the selected columns is
+                # cheaper than slicing and re-transposing the matrix per query
+                scores = scores[:, rows]
+            scored = time.perf_counter()
+            for row in scores:
+                ranked = self._select(row, limit)
+                if rows is not None:
+                    ranked = [(int(rows[position]), score) for position, score in ranked]
+                results.append(ranked)
+            scoring += scored - started
+            selecting += time.perf_counter() - scored
+
+        if timings is not None:
+            timings['scoring'] = timings.get('scoring', 0.0) + scoring
+            timings['top_k'] = timings.get('top_k', 0.0) + selecting
+        return results
+
+    @staticmethod
+    def _select(row, limit: int) -> List[Tuple[int, float]]:
+        """Pick the top `limit` entries of a score row, breaking ties by position."""
+        if limit < row.shape[0]:
+            partition = np.argpartition(-row, limit - 1)[:limit]
+            threshold = row[partition].min()
+            above = np.flatnonzero(row > threshold)
+            tied = np.flatnonzero(row == threshold)[:limit - above.shape[0]]
+            candidates = np.concatenate([above, tied])
+        else:
+            candidates = np.arange(row.shape[0])
+
+        order = candidates[np.lexsort((candidates, -row[candidates]))]
+        return [(int(position), float(row[position])) for position in order]
@@ -1,7 +1,11 @@
 import psycopg2
+import psycopg2.extensions
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from contextlib import contextmanager
+import metrics
 
 load_dotenv()
 
@@ -15,16 +19,219 @@ DATABASE_CONFIG = {
     'channel_binding': "require"
 }
 
+POOL_CONFIG = {
+    'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    # Idle connections older than this are closed instead of reused
+    'max_idle_seconds': float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300")),
+    # Connections idle for longer than this are pinged before reuse; fresher ones are handed out as is
+    'health_check_idle_seconds': float(os.getenv("DB_POOL_HEALTH_CHECK_IDLE_SECONDS", "5")),
+    # How long a checkout waits for a free connection before failing
+    'timeout_seconds': float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30")),
+}
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe PostgreSQL connection pool.
+    Checkouts block (up to a timeout) when max_size connections are in use,
+    connections idle for longer than health_check_idle_seconds are pinged
+    before reuse, and connections idle for longer than max_idle_seconds are
+    closed instead of reused.
+    """
+
+    def __init__(self, max_size: int, max_idle_seconds: float, timeout_seconds: float,
+                 health_check_idle_seconds: float = 5.0, **connect_kwargs):
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_idle_seconds = health_check_idle_seconds
+        self.timeout_seconds = timeout_seconds
+        self._connect_kwargs = connect_kwargs
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # (connection, monotonic time it was returned), most recently returned last
+        self._idle = []
+        self._in_use = 0
+        self._checkouts = 0
+        self._connects = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._discarded = 0
+
+    def getconn(self):
+        """Check out a healthy connection, waiting for a free slot if necessary."""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout_seconds):
+                raise PoolTimeoutError(
+                    f"No database connection available after {self.timeout_seconds}s"
+                )
+        waited = time.monotonic() - start
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_seconds += waited
+        return conn
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, returned_at = self._idle.pop()
+
+            idle_for = time.monotonic() - returned_at
+            if conn.closed or idle_for > self.max_idle_seconds:
+                self._discard(conn)
+                continue
+            # A connection returned moments ago was working then; only older ones cost a ping
+            if idle_for <= self.health_check_idle_seconds or self._is_alive(conn):
+                return conn
+            self._discard(conn)
+
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._lock:
+            self._connects += 1
+        return conn
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        """Ping with SELECT 1 in autocommit, so no transaction is left to roll back."""
+        try:
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+            finally:
+                conn.autocommit = autocommit
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._discarded += 1
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection; broken or explicitly closed ones are dropped."""
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True  # server connection lost
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+
+            if close or conn.closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+        self._prune_idle()
+
+    def _prune_idle(self):
+        """Close idle connections that outlived max_idle_seconds."""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        with self._lock:
+            expired = [conn for conn, returned_at in self._idle if returned_at < cutoff]
+            self._idle = [(conn, returned_at) for conn, returned_at in self._idle if returned_at >= cutoff]
+        for conn in expired:
+            self._discard(conn)
+
+    def closeall(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        """Pool metrics: connections in use, checkouts, waits and total wait time."""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "waits": self._waits,
+                "wait_time_seconds": round(self._wait_seconds, 6),
+                "discarded": self._discarded,
+            }
+
+
+connection_pool = ConnectionPool(**POOL_CONFIG, **DATABASE_CONFIG)
+
+
+def _register_pool_metrics(pool: ConnectionPool):
+    """Expose pool usage on /metrics, read from pool.stats() at scrape time."""
+    for name, key, type_name, documentation in (
+        ("db_pool_connections_in_use", "in_use", "gauge", "Pooled connections checked out."),
+        ("db_pool_connections_idle", "idle", "gauge", "Pooled connections waiting for reuse."),
+        ("db_pool_checkouts_total", "checkouts", "counter", "Connection checkouts."),
+        ("db_pool_waits_total", "waits", "counter", "Checkouts that had to wait for a free connection."),
+        ("db_pool_wait_seconds_total", "wait_time_seconds", "counter", "Time spent waiting for connections."),
+    ):
+        metrics.REGISTRY.register(metrics.CallbackMetric(
+            name, documentation, lambda key=key: pool.stats()[key], type_name=type_name
+        ), replace=True)
+
+
+_register_pool_metrics(connection_pool)
+
+
 @contextmanager
-def get_db_connection():
+def get_db_connection(readonly: bool = False):
+    """
+    Check out a pooled connection for the block. With readonly, statements run
+    in autocommit, so no transaction is opened and none has to be rolled back
+    on return; server-side (named) cursors need a transaction and cannot use it.
+    """
     conn = None
+    broken = False
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = connection_pool.getconn()
+        if readonly:
+            conn.autocommit = True
         yield conn
     except Exception as e:
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            broken = True
         raise e
     finally:
         if conn:
-            conn.close()
+            if readonly and not conn.closed:
+                try:
+                    conn.autocommit = False
+                except psycopg2.Error:
+                    broken = True
+            connection_pool.putconn(conn, close=broken)
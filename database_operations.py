@@ -1,6 +1,10 @@
 
 from database import get_db_connection
-from typing import List, Dict, Optional
+from config import EVENTS_FETCH_SIZE, EVENTS_UPDATED_AT_COLUMN, INGEST_PAGE_SIZE
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from typing import List, Dict, Iterator, Optional, Tuple
+import uuid
 
 # Rest of your DatabaseOperations class...
 
@@ -9,31 +13,93 @@ class DatabaseOperations:
     @staticmethod
     def get_user_interests(user_id: int) -> Optional[str]:
         """Get user interests as a single string."""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cur = conn.cursor()
             cur.execute("SELECT interests FROM users WHERE id = %s", (user_id,))  # Changed to 'interests'
             result = cur.fetchone()
             return result[0] if result else None
     
+    @staticmethod
+    def get_users_interests(user_ids: List[int]) -> Dict[int, str]:
+        """Get interests for many users in one query, keyed by user id."""
+        if not user_ids:
+            return {}
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id, interests FROM users WHERE id = ANY(%s)", (list(user_ids),))
+            return {user_id: interests for user_id, interests in cur.fetchall()}
+    
+    @staticmethod
+    def iter_users_interests(batch_size: int = EVENTS_FETCH_SIZE) -> Iterator[Tuple[int, Optional[str]]]:
+        """Stream (user id, interests) for every user through one server-side cursor."""
+        with get_db_connection() as conn:
+            cur = conn.cursor(name=f"users_stream_{uuid.uuid4().hex}")
+            cur.itersize = batch_size
+            try:
+                cur.execute("SELECT id, interests FROM users")
+                for user_id, interests in cur:
+                    yield user_id, interests
+            finally:
+                cur.close()
+    
     @staticmethod
     def get_all_events() -> List[Dict]:
         """Get all events with their categories."""
+        return list(DatabaseOperations.iter_events())
+    
+    @staticmethod
+    def iter_events(batch_size: int = EVENTS_FETCH_SIZE) -> Iterator[Dict]:
+        """
+        Stream all events with their categories through a server-side cursor.
+        Only `batch_size` rows are held client-side at a time; the pooled
+        connection stays checked out until the generator is exhausted or closed.
+        """
         with get_db_connection() as conn:
+            cur = conn.cursor(name=f"events_stream_{uuid.uuid4().hex}")
+            cur.itersize = batch_size
+            try:
+                cur.execute("""
+                    SELECT id, title, description, category as category_name
+                    FROM events
+                """)
+                columns = None
+                for row in cur:
+                    # Named cursors only describe their columns after the first fetch
+                    if columns is None:
+                        columns = [desc[0] for desc in cur.description]
+                    yield dict(zip(columns, row))
+            finally:
+                cur.close()
+    
+    @staticmethod
+    def get_events_watermark() -> str:
+        """
+        Get a fingerprint of the events table that changes whenever any event
+        is inserted, updated or deleted. Only one row leaves the database.
+        With EVENTS_UPDATED_AT_COLUMN set, the fingerprint comes from aggregates
+        an index can answer instead of a hash over every row.
+        """
+        with get_db_connection(readonly=True) as conn:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT id, title, description, category as category_name
-                FROM events
-            """)
-            columns = [desc[0] for desc in cur.description]
-            events = []
-            for row in cur.fetchall():
-                events.append(dict(zip(columns, row)))
-            return events
+            if EVENTS_UPDATED_AT_COLUMN:
+                cur.execute(sql.SQL("""
+                    SELECT count(*), coalesce(max(id), 0), coalesce(max({})::text, '')
+                    FROM events
+                """).format(sql.Identifier(EVENTS_UPDATED_AT_COLUMN)))
+            else:
+                cur.execute("""
+                    SELECT count(*), coalesce(max(id), 0),
+                           coalesce(md5(string_agg(md5(concat_ws('|', id, title, description, category)),
+                                                   ',' ORDER BY id)), '')
+                    FROM events
+                """)
+            count, max_id, digest = cur.fetchone()
+            return f"{count}:{max_id}:{digest}"
     
     @staticmethod
     def get_events_by_category(category_name: str) -> List[Dict]:
         """Get events filtered by category."""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cur = conn.cursor()
             cur.execute("""
                 SELECT id, title, description, category as category_name
@@ -58,3 +124,21 @@ class DatabaseOperations:
             event_id = cur.fetchone()[0]
             conn.commit()
             return event_id
+    
+    @staticmethod
+    def create_events(events: List[Dict]) -> List[int]:
+        """
+        Insert many events in one transaction and return their IDs in input order.
+        Rows go out as multi-row INSERTs of INGEST_PAGE_SIZE rows each.
+        """
+        if not events:
+            return []
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            rows = execute_values(cur, """
+                INSERT INTO events (title, description, category)
+                VALUES %s RETURNING id
+            """, [(event['title'], event['description'], event['category_name']) for event in events],
+                page_size=INGEST_PAGE_SIZE, fetch=True)
+            conn.commit()
+            return [row[0] for row in rows]
@@ -3,15 +3,39 @@ import os
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from models import RecommendationRequest, RecommendationResponse
-from recommendation_service import RecommendationService
+from fastapi.responses import Response
+from models import (
+    RecommendationRequest, RecommendationResponse,
+    BatchRecommendationRequest, BatchRecommendationResponse,
+    BulkEventsRequest, BulkEventsResponse
+)
+from recommendation_service import RecommendationService, ServiceOverloaded
+from database import connection_pool
+from config import (
+    MODEL_REFRESH_INTERVAL_SECONDS, PRECOMPUTE_USER_PROFILES, MAX_BULK_EVENTS, MAX_BATCH_USERS
+)
+import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PRECOMPUTE_USER_PROFILES:
+        await recommendation_service.precompute_profiles_async()
+    recommendation_service.start_refresher(MODEL_REFRESH_INTERVAL_SECONDS)
+    yield
+    recommendation_service.close()
+    connection_pool.closeall()
+
 
 app = FastAPI(
     title="Event Recommendation API", 
     version="1.0.0",
-    description="TF-IDF based event recommendation system"
+    description="TF-IDF based event recommendation system",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -35,37 +59,121 @@ async def root():
         "description": "Get personalized event recommendations using TF-IDF and cosine similarity"
     }
 
+def build_response(user_id: int, recommendations) -> RecommendationResponse:
+    """Wrap recommended events in the API response with a summary message."""
+    if not recommendations:
+        return RecommendationResponse(
+            user_id=user_id,
+            recommended_events=[],
+            message="No events found matching your interests"
+        )
+    
+    # Create message with event names
+    event_names = [event.title for event in recommendations]
+    message = f"Recommended events: {', '.join(event_names)}"
+    
+    return RecommendationResponse(
+        user_id=user_id,
+        recommended_events=recommendations,
+        message=message
+    )
+
+def overloaded(error: ServiceOverloaded) -> HTTPException:
+    """503 for a request turned away at the admission limit; clients should retry shortly."""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
+
 @app.post("/recommend", response_model=RecommendationResponse)
 async def get_recommendations(request: RecommendationRequest):
     """Get personalized event recommendations for a user."""
     try:
-        recommendations = recommendation_service.get_user_recommendations(
+        recommendations = await recommendation_service.get_user_recommendations_async(
             user_id=request.user_id,
-            limit=request.limit
+            limit=request.limit,
+            include_categories=request.include_categories,
+            exclude_categories=request.exclude_categories
         )
+        return build_response(request.user_id, recommendations)
         
-        if not recommendations:
-            return RecommendationResponse(
-                user_id=request.user_id,
-                recommended_events=[],
-                message="No events found matching your interests"
-            )
-        
-        # Create message with event names
-        event_names = [event.title for event in recommendations]
-        message = f"Recommended events: {', '.join(event_names)}"
-        
-        return RecommendationResponse(
-            user_id=request.user_id,
-            recommended_events=recommendations,
-            message=message
+    except ServiceOverloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Get personalized event recommendations for many users in one call."""
+    if len(request.user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_USERS} users per request")
+    try:
+        results = await recommendation_service.get_batch_user_recommendations_async(
+            user_ids=request.user_ids,
+            limit=request.limit,
+            include_categories=request.include_categories,
+            exclude_categories=request.exclude_categories
+        )
+        return BatchRecommendationResponse(
+            results=[build_response(user_id, recommendations) for user_id, recommendations in results.items()]
         )
         
+    except ServiceOverloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recommend/{user_id}")
-async def get_user_recommendations_by_id(user_id: int, limit: int = 10):
+async def get_user_recommendations_by_id(user_id: int, limit: int = Query(10, ge=1),
+                                         include_categories: Optional[List[str]] = Query(None),
+                                         exclude_categories: Optional[List[str]] = Query(None)):
     """Convenient endpoint to get recommendations for a specific user."""
-    request = RecommendationRequest(user_id=user_id, limit=limit)
+    request = RecommendationRequest(
+        user_id=user_id,
+        limit=limit,
+        include_categories=include_categories,
+        exclude_categories=exclude_categories
+    )
     return await get_recommendations(request)
+
+@app.post("/events/bulk", response_model=BulkEventsResponse)
+async def create_events_bulk(request: BulkEventsRequest):
+    """Insert many events in one transaction and make them recommendable with one model update."""
+    if len(request.events) > MAX_BULK_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_EVENTS} events per request")
+    try:
+        event_ids = await recommendation_service.create_events_async(
+            [event.model_dump() for event in request.events]
+        )
+        return BulkEventsResponse(event_ids=event_ids, count=len(event_ids))
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/refresh")
+async def refresh_model(force: bool = True):
+    """Refit the model now (or only if events changed, with force=false) and report the outcome."""
+    return await recommendation_service.refresh_model_async(force=force)
+
+@app.get("/admin/refresh")
+async def get_refresh_status():
+    """Report the state and outcome of the latest model refresh."""
+    return recommendation_service.refresh_status()
+
+@app.post("/admin/profiles/precompute")
+async def precompute_profiles():
+    """Build every user's interest vector from one query so requests only score."""
+    return await recommendation_service.precompute_profiles_async()
+
+@app.post("/admin/users/{user_id}/invalidate")
+async def invalidate_user(user_id: int):
+    """Hook for changed user interests: the next request reads them again."""
+    await recommendation_service.invalidate_user_async(user_id)
+    return {"user_id": user_id, "invalidated": True}
+
+@app.get("/stats")
+async def get_model_stats():
+    """Report corpus, vocabulary and cache statistics of the served model."""
+    return recommendation_service.get_model_stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose counters and stage latency histograms in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
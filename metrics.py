@@ -0,0 +1,244 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are thread-safe and may carry labels.
+CallbackMetric reads a value when /metrics is scraped, for state that
+already lives elsewhere (cache counters, pool usage, corpus size).
+render() serializes every registered metric.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; hot-path stages are sub-millisecond to tens of ms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Full fits and refreshes take seconds to minutes
+FIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, formatted labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for sample, labels, value in self.samples():
+            lines.append(f"{sample}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in values]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall-clock duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(float(bound)),))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class CallbackMetric(_Metric):
+    """
+    Counter or gauge whose value is read at scrape time. The callback returns
+    a number, or a dict mapping label value tuples to numbers.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object],
+                 type_name: str = "gauge", labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.type_name = type_name
+        self._callback = callback
+
+    def samples(self):
+        value = self._callback()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [(self.name, _format_labels(self.labelnames, key), float(sample))
+                for key, sample in sorted(value.items())]
+
+
+class Registry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric, replace: bool = False) -> _Metric:
+        """Add a metric; with replace, an existing metric of the same name is swapped out."""
+        with self._lock:
+            if metric.name in self._metrics and not replace:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception:  # a failing callback must not break the whole scrape
+                continue
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "recommender_stage_seconds", "Time spent in each recommendation stage.", ("stage",)))
+REQUESTS = REGISTRY.register(Counter(
+    "recommender_requests_total", "Recommendation requests by kind (single or batch).", ("kind",)))
+USERS_SCORED = REGISTRY.register(Counter(
+    "recommender_users_scored_total", "Users scored against the corpus, cache misses only."))
+EMPTY_RESULTS = REGISTRY.register(Counter(
+    "recommender_empty_results_total", "Recommendations returned without any event."))
+ERRORS = REGISTRY.register(Counter(
+    "recommender_errors_total", "Recommendation requests that failed, by kind.", ("kind",)))
+FIT_SECONDS = REGISTRY.register(Histogram(
+    "recommender_fit_seconds", "Duration of full model fits, including the event load.", buckets=FIT_BUCKETS))
+FITS = REGISTRY.register(Counter(
+    "recommender_fits_total", "Full model fits and artifact loads by outcome.", ("outcome",)))
+COALESCED = REGISTRY.register(Counter(
+    "recommender_coalesced_requests_total", "Requests answered by an identical request already in flight."))
+REJECTED = REGISTRY.register(Counter(
+    "recommender_rejected_requests_total", "Requests turned away at the admission limit, by kind.", ("kind",)))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a hot-path stage into recommender_stage_seconds."""
+    with STAGE_SECONDS.time(stage=name):
+        yield
+
+
+def observe_stages(timings: Dict[str, float]):
+    """Record stage durations measured inside the engine."""
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """
+    Yield from `iterable`, recording the total time spent waiting on it as
+    one observation of stage `name` once it is exhausted.
+    """
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                break
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        STAGE_SECONDS.observe(elapsed, stage=name)
+
+
+def render(registry: Optional[Registry] = None) -> str:
+    """Serialize the registry in the Prometheus text format."""
+    return (registry or REGISTRY).render()
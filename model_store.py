@@ -0,0 +1,155 @@
+"""
+Versioned on-disk artifact for a fitted TFIDFRecommendationEngine.
+
+An artifact is a directory holding manifest.json (format version, events
+watermark, document field weights, term and category tables), events.json (the event rows served in responses)
+and one .npy file per array from TFIDFRecommendationEngine.export_arrays().
+Arrays are loaded with memory-mapping, so workers on the same machine share
+the page cache instead of each holding a private copy of the corpus.
+
+Artifacts are never modified once written. Each save creates a new version
+directory under the model path and then atomically replaces the CURRENT
+file naming it, so a reader resolves the pointer once and reads every file
+of one artifact even while another process saves the next.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from csr_backend import np, is_available as numpy_available
+from recommendation_engine import TFIDFRecommendationEngine
+
+FORMAT_VERSION = 3
+MANIFEST_FILE = "manifest.json"
+EVENTS_FILE = "events.json"
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "v-"
+# Superseded versions kept for readers that resolved the pointer before a save
+KEEP_PREVIOUS = 2
+
+
+def current_artifact(path: str) -> Optional[str]:
+    """Directory of the artifact the CURRENT pointer under `path` names, or None."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(path, name) if name else None
+
+
+def save_model(path: str, engine: TFIDFRecommendationEngine, events: List[Dict], watermark: str) -> str:
+    """
+    Write the engine and its event rows as a new artifact version under `path`
+    and make it current. The version is assembled in a temp directory, renamed
+    to its final name and only then published through the pointer, so readers
+    never observe a half-written artifact. Returns the version directory.
+    """
+    terms, categories, arrays = engine.export_arrays()
+    os.makedirs(path, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".model-", dir=path)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(staging, EVENTS_FILE), "w") as f:
+            json.dump([dict(event) for event in events], f)
+        # The manifest is written last; an artifact without one is ignored
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump({
+                "format_version": FORMAT_VERSION,
+                "watermark": watermark,
+                "pending_changes": engine.pending_changes,
+                "field_weights": engine.field_weights,
+                "arrays": sorted(arrays),
+                "terms": terms,
+                "categories": categories,
+            }, f)
+
+        # Names sort by creation time, which is what pruning relies on
+        name = f"{VERSION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(path, name)
+        os.rename(staging, version_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = tempfile.NamedTemporaryFile("w", dir=path, prefix=".current-", delete=False)
+    try:
+        with pointer:
+            pointer.write(name)
+        os.replace(pointer.name, os.path.join(path, CURRENT_FILE))
+    except Exception:
+        os.unlink(pointer.name)
+        raise
+    _prune(path, name)
+    return version_dir
+
+
+def _prune(path: str, current: str):
+    """Remove versions older than the KEEP_PREVIOUS most recent ones besides `current`."""
+    versions = sorted(
+        name for name in os.listdir(path)
+        if name.startswith(VERSION_PREFIX) and name != current
+    )
+    for name in versions[:max(0, len(versions) - KEEP_PREVIOUS)]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def load_model(path: str, watermark: str, backend: str = "python",
+               idf_drift_threshold: Optional[float] = 0.1,
+               mmap: bool = True, ann_lists: Optional[int] = None, ann_probes: int = 0,
+               field_weights: Optional[Dict[str, float]] = None
+               ) -> Optional[Tuple[TFIDFRecommendationEngine, List[Dict]]]:
+    """
+    Load the current artifact under `path` if there is one, it has the current
+    format version and was built for `watermark` with `field_weights`.
+    Returns (engine, events) or None.
+    """
+    if not numpy_available():
+        logging.warning("numpy/scipy not installed; model artifacts are disabled")
+        return None
+
+    # Every file below is read from the one version the pointer named
+    path = current_artifact(path)
+    if path is None:
+        return None
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        logging.info(f"Ignoring model artifact with format version {manifest.get('format_version')}")
+        return None
+    if manifest.get("watermark") != watermark:
+        logging.info("Model artifact is stale for the current events watermark")
+        return None
+    if manifest.get("field_weights") != (field_weights or {}):
+        logging.info("Model artifact was built with other document field weights")
+        return None
+
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in manifest["arrays"]
+    }
+    with open(os.path.join(path, EVENTS_FILE)) as f:
+        events = json.load(f)
+
+    engine = TFIDFRecommendationEngine.from_arrays(
+        manifest["terms"], manifest["categories"], arrays,
+        backend=backend,
+        idf_drift_threshold=idf_drift_threshold,
+        pending_changes=manifest.get("pending_changes", 0),
+        ann_lists=ann_lists,
+        ann_probes=ann_probes,
+        field_weights=manifest["field_weights"]
+    )
+    return engine, events
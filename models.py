@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class RecommendationRequest(BaseModel):
     user_id: int
-    limit: Optional[int] = 10
+    limit: int = Field(10, ge=1)
+    include_categories: Optional[List[str]] = None
+    exclude_categories: Optional[List[str]] = None
 
 class EventResponse(BaseModel):
     id: int
@@ -16,3 +18,24 @@ class RecommendationResponse(BaseModel):
     user_id: int
     recommended_events: List[EventResponse]
     message: str
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[int]
+    limit: int = Field(10, ge=1)
+    include_categories: Optional[List[str]] = None
+    exclude_categories: Optional[List[str]] = None
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[RecommendationResponse]
+
+class EventCreate(BaseModel):
+    title: str
+    description: str
+    category_name: str
+
+class BulkEventsRequest(BaseModel):
+    events: List[EventCreate]
+
+class BulkEventsResponse(BaseModel):
+    event_ids: List[int]
+    count: int
@@ -0,0 +1,63 @@
+"""
+Per-user interest vectors kept between requests.
+
+A profile holds the term frequencies of a user's interests, which depend only
+on the text, and the normalized TF-IDF vector weighed from them for one model
+version. When the served model changes, the vector is weighed again from the
+stored terms without touching the database; the interests themselves are read
+again only after an invalidation or once the profile is older than its TTL.
+"""
+import time
+from typing import Dict, Optional
+
+from recommendation_engine import TFIDFRecommendationEngine
+
+
+class UserProfileStore:
+    """Profiles keyed by user id on top of a cache backend from create_cache()."""
+
+    def __init__(self, cache, ttl_seconds: float):
+        self._cache = cache
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"profile:{user_id}"
+
+    def vector(self, user_id: int, engine: TFIDFRecommendationEngine, version: str,
+               timings: Optional[Dict[str, float]] = None) -> Optional[Dict[str, float]]:
+        """
+        The user's vector under model `version`, re-weighed if it was built for
+        another one. None when the interests have to be read first.
+        """
+        profile = self._cache.get(self._key(user_id))
+        if profile is None or time.time() - profile['loaded_at'] > self.ttl_seconds:
+            return None
+        if profile['version'] != version:
+            terms = profile['terms']
+            profile = dict(profile, version=version,
+                           vector=engine.weigh_profile(terms, timings) if terms else {})
+            self._cache.set(self._key(user_id), profile)
+        return profile['vector']
+
+    def build(self, user_id: int, interests: Optional[str], engine: TFIDFRecommendationEngine,
+              version: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Tokenize and weigh freshly read interests; users without any get an empty vector."""
+        terms = engine.profile_terms(interests, timings) if interests else {}
+        vector = engine.weigh_profile(terms, timings) if terms else {}
+        self._cache.set(self._key(user_id), {
+            'terms': terms,
+            'version': version,
+            'vector': vector,
+            'loaded_at': time.time(),
+        })
+        return vector
+
+    def invalidate(self, user_id: int):
+        self._cache.delete(self._key(user_id))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
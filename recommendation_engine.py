@@ -1,19 +1,96 @@
 
+import copy
 import math
-from typing import List, Dict, Tuple
+import heapq
+import threading
+import time
+from array import array
+from typing import Callable, Collection, List, Dict, Iterable, Mapping, Tuple, Optional, Union
 from collections import Counter
 from utils.text_processing import TextProcessor
+from compact_vectors import Postings, SparseVector, TermTable, empty_vector, new_postings
+from csr_backend import CSRCorpus, build_csr_from_buffers, np, sparse, is_available as csr_available
+from ann_index import IVFIndex, align_centroids, default_lists, train_centroids
+
+BACKENDS = ("python", "csr")
+
+# Partition of events indexed without a category
+UNCATEGORIZED = ""
+
+# Distinct category filters whose matrix rows are memoized per CSR corpus
+MAX_ROW_SELECTIONS = 256
+
+# A document is one text, or texts keyed by field name and weighed by field_weights
+Document = Union[str, Mapping[str, str]]
+
+
+def _add_timing(timings: Dict[str, float], stage: str, seconds: float):
+    timings[stage] = timings.get(stage, 0.0) + seconds
 
 # Rest of your TFIDFRecommendationEngine class...
 
 
 
 class TFIDFRecommendationEngine:
-    def __init__(self):
+    def __init__(self, backend: str = "python", idf_drift_threshold: Optional[float] = 0.1,
+                 ann_lists: Optional[int] = None, ann_probes: int = 0,
+                 field_weights: Optional[Dict[str, float]] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+        if backend == "csr" and not csr_available():
+            raise ImportError("The csr backend requires numpy and scipy to be installed")
+        if ann_probes > 0 and backend != "csr":
+            raise ValueError("Approximate retrieval (ann_probes > 0) requires the csr backend")
+        
+        self.backend = backend
+        # Multiplier of each field's term counts in multi-field documents; unlisted fields count once
+        self.field_weights = dict(field_weights or {})
+        # Fraction of the corpus that may change before IDF is recomputed; None disables it
+        self.idf_drift_threshold = idf_drift_threshold
+        # IVF lists probed per query; 0 keeps exact ranking, more probes trade latency for recall
+        self.ann_probes = ann_probes
+        # Number of IVF lists; None sizes them from the corpus
+        self.ann_lists = ann_lists
+        # (terms, centroid matrix) from the last fit, kept across incremental
+        # updates so only the assignment of documents to lists is redone
+        self._ann_centroids = None
+        # (CSR corpus tuple the index was built for, IVFIndex)
+        self._ann = None
+        # Ids added or changed since the IVF index was built; only they are reassigned to lists
+        self._ann_changed = set()
+        # (CSR corpus tuple, selected categories -> sorted matrix rows), so
+        # repeated filters do not re-merge their category rows
+        self._row_selections = None
         self.text_processor = TextProcessor()
         self.vocabulary = set()
-        self.idf_scores = {}
-        self.document_vectors = []
+        # Interned terms; vectors below refer to terms by their id in this table
+        self._terms = TermTable()
+        # term id -> IDF (float32), 0 for terms no longer in the vocabulary
+        self._idf = array('f')
+        # term id -> number of documents containing it
+        self._df = array('I')
+        # event id -> term frequencies as a SparseVector, kept so IDF can be recomputed without re-tokenizing
+        self.term_frequencies = {}
+        # event id -> L2-normalized TF-IDF SparseVector, in corpus order
+        self.document_vectors = {}
+        # event id -> category the event is partitioned under
+        self.categories = {}
+        # category -> term -> Postings (event ids, normalized weights); postings are replaced, never mutated.
+        # Only the python backend scores from them, so the csr backend leaves them empty
+        self.partitions = {}
+        # category -> ids of its events in corpus order (dict keys), including those
+        # without postings; filtered rankings are padded from it
+        self._category_events = {}
+        # event id -> insertion sequence, used to break score ties in corpus order
+        self._order = {}
+        self._next_order = 0
+        # Documents added, updated or removed since IDF was last computed
+        self.pending_changes = 0
+        # (event ids, CSRCorpus, category -> row positions) for the csr backend, rebuilt lazily after changes
+        self._csr = None
+        # Arrays of a loaded model artifact, expanded into the dicts above on first need
+        self._arrays = None
+        self._materialize_lock = threading.Lock()
         
     def calculate_tf(self, tokens: List[str]) -> Dict[str, float]:
         """Calculate Term Frequency for a document."""
@@ -29,25 +106,43 @@ class TFIDFRecommendationEngine:
             
         return tf_scores
     
+    def calculate_field_tf(self, fields: Mapping[str, str],
+                           tokenize: Optional[Callable[[str], List[str]]] = None) -> Dict[str, float]:
+        """
+        Term frequencies of a multi-field document. Each field's token counts
+        and length are scaled by its weight, so with equal weights the result
+        matches calculate_tf() on the fields joined into one text.
+        """
+        tokenize = tokenize or self.text_processor.preprocess_text
+        counts = {}
+        length = 0.0
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            if weight <= 0:
+                continue
+            tokens = tokenize(text)
+            for token, count in Counter(tokens).items():
+                counts[token] = counts.get(token, 0.0) + weight * count
+            length += weight * len(tokens)
+        if not length:
+            return {}
+        return {token: count / length for token, count in counts.items()}
+    
+    def _document_tf(self, document: Document, tokenize: Callable[[str], List[str]]) -> Dict[str, float]:
+        if isinstance(document, str):
+            return self.calculate_tf(tokenize(document))
+        return self.calculate_field_tf(document, tokenize)
+    
     def calculate_idf(self, documents: List[str]) -> Dict[str, float]:
         """Calculate Inverse Document Frequency for vocabulary."""
         total_documents = len(documents)
         if total_documents == 0:
             return {}
         
-        # Get vocabulary from all documents
-        self.vocabulary = self.text_processor.get_vocabulary(documents)
-        
-        # Count documents containing each term
-        term_doc_count = {}
-        for term in self.vocabulary:
-            term_doc_count[term] = 0
-            
-        for doc in documents:
-            tokens = set(self.text_processor.preprocess_text(doc))
-            for term in tokens:
-                if term in term_doc_count:
-                    term_doc_count[term] += 1
+        # Tokenize once, then derive vocabulary and document counts from the tokens
+        token_lists = self.text_processor.tokenize_documents(documents)
+        self.vocabulary = self.text_processor.vocabulary_from_tokens(token_lists)
+        term_doc_count = self.text_processor.document_frequency_from_tokens(token_lists)
         
         # Calculate IDF scores
         idf_scores = {}
@@ -59,6 +154,24 @@ class TFIDFRecommendationEngine:
                 
         return idf_scores
     
+    @property
+    def idf_scores(self) -> Dict[str, float]:
+        """IDF of every vocabulary term, as a new dict."""
+        idf, ids = self._idf, self._terms.ids
+        return {term: idf[ids[term]] for term in self.vocabulary}
+    
+    @property
+    def document_frequency(self) -> Dict[str, int]:
+        """Number of documents containing each vocabulary term, as a new dict."""
+        self._materialize()
+        df, ids = self._df, self._terms.ids
+        return {term: df[ids[term]] for term in self.vocabulary}
+    
+    def idf(self, term: str) -> float:
+        """IDF of a term, or 0 if it is not in the vocabulary."""
+        term_id = self._terms.get(term)
+        return self._idf[term_id] if term_id is not None else 0.0
+    
     def calculate_tfidf_vector(self, document: str) -> Dict[str, float]:
         """Calculate TF-IDF vector for a single document."""
         tokens = self.text_processor.preprocess_text(document)
@@ -67,8 +180,7 @@ class TFIDFRecommendationEngine:
         tfidf_vector = {}
         for term in self.vocabulary:
             tf = tf_scores.get(term, 0)
-            idf = self.idf_scores.get(term, 0)
-            tfidf_vector[term] = tf * idf
+            tfidf_vector[term] = tf * self.idf(term)
             
         return tfidf_vector
     
@@ -89,15 +201,594 @@ class TFIDFRecommendationEngine:
         
         return dot_product / (magnitude1 * magnitude2)
     
-    def fit(self, documents: List[str]):
-        """Fit the TF-IDF model on a corpus of documents."""
-        self.idf_scores = self.calculate_idf(documents)
+    def normalize_vector(self, vector: Dict[str, float]) -> Dict[str, float]:
+        """Scale a sparse vector to unit L2 length."""
+        magnitude = math.sqrt(sum(score ** 2 for score in vector.values()))
+        if magnitude == 0:
+            return {}
+        return {term: score / magnitude for term, score in vector.items()}
+    
+    @property
+    def event_ids(self) -> List[int]:
+        """Ids of the indexed documents in corpus order."""
+        arrays = self._arrays
+        if arrays is not None:
+            return arrays['event_ids'].tolist()
+        return list(self.document_vectors)
+    
+    def fit(self, documents: List[Document], event_ids: Optional[List[int]] = None,
+            categories: Optional[List[str]] = None):
+        """
+        Fit the TF-IDF model on a corpus of documents.
+        When event_ids is given, indexed recommendations return those ids;
+        otherwise documents are identified by their position. Documents are
+        partitioned by `categories` so filtered queries only score their subset.
+        """
+        if event_ids is None:
+            event_ids = range(len(documents))
+        if categories is None:
+            categories = [UNCATEGORIZED] * len(documents)
+        self.fit_records(zip(event_ids, documents, categories))
+    
+    def fit_records(self, records: Iterable[Tuple[int, Document, Optional[str]]]):
+        """
+        Fit the TF-IDF model on a stream of (event id, document, category) records.
+        Each record is tokenized and dropped as soon as its term frequencies are
+        counted, so a database cursor can feed the fit without the corpus ever
+        being held as a list. A document given as {field: text} is weighed by
+        field_weights into its single precomputed vector.
+        """
+        self._arrays = None
+        self._ann_centroids = None
+        self._terms = TermTable()
+        self._idf = array('f')
+        self._df = array('I')
+        self.term_frequencies = {}
+        self.categories = {}
+        self._order = {}
+        self._next_order = 0
+        for event_id, document, category in records:
+            self.term_frequencies[event_id] = self._count_terms(
+                self._document_tf(document, self.text_processor.tokenize))
+            self.categories[event_id] = category or UNCATEGORIZED
+            self._assign_order(event_id)
+        
+        self.recompute_idf()
+    
+    def recompute_idf(self):
+        """Recompute IDF from the current document frequencies and rebuild every vector."""
+        self._materialize()
+        total_documents = len(self.term_frequencies)
+        terms = self._terms.terms
+        self.vocabulary = {terms[term_id] for term_id, doc_count in enumerate(self._df) if doc_count}
+        self._idf = array('f', (
+            math.log(total_documents / doc_count) if doc_count else 0.0 for doc_count in self._df
+        ))
+        
+        # Pre-calculate normalized TF-IDF vectors and the partitioned inverted index
+        self.document_vectors = {}
+        for event_id, tf_vector in self.term_frequencies.items():
+            self.document_vectors[event_id] = self._weigh_vector(tf_vector)
+        if self.backend == "python":
+            self.partitions = self._build_partitions(self.document_vectors, self.categories, terms)
+        self._category_events = self._group_by_category(self.categories)
+        
+        self.pending_changes = 0
+        self._csr = None
+        # Every vector changed, so every document is assigned to a list again
+        self._ann = None
+        self._ann_changed = set()
+        self._ensure_ann(self._ensure_csr())
+    
+    def add_document(self, event_id: int, document: Document, category: Optional[str] = None):
+        """Add a single document to the fitted model, or update it if the id is already indexed."""
+        self._materialize()
+        if event_id in self.term_frequencies:
+            self.update_document(event_id, document, category)
+            return
+        
+        self._assign_order(event_id)
+        self._insert(event_id, document, category or UNCATEGORIZED)
+        self._record_change((event_id,))
+    
+    def update_document(self, event_id: int, document: Document, category: Optional[str] = None):
+        """
+        Replace the text of an indexed document, keeping its place in corpus order.
+        The document keeps its category unless a new one is given.
+        """
+        self._materialize()
+        if event_id not in self.term_frequencies:
+            self.add_document(event_id, document, category)
+            return
+        
+        if category is None:
+            category = self.categories[event_id]
+        self._delete(event_id)
+        self._insert(event_id, document, category)
+        self._record_change((event_id,))
+    
+    def add_documents(self, records: Iterable[Tuple[int, Document, Optional[str]]]):
+        """
+        Add or update many (event id, document, category) records as one change.
+        Each touched term's postings are copied once for the whole batch rather
+        than once per document, and the IDF drift check runs once at the end.
+        Updated documents keep their category unless a new one is given; the
+        last record wins when an id repeats.
+        """
+        self._materialize()
+        batch = {}
+        for event_id, document, category in records:
+            batch[event_id] = (document, category)
+        if not batch:
+            return
+        
+        for event_id, (document, category) in batch.items():
+            if event_id in self.term_frequencies:
+                if category is None:
+                    category = self.categories[event_id]
+                self._delete(event_id)
+            else:
+                self._assign_order(event_id)
+            self.term_frequencies[event_id] = self._count_terms(
+                self._document_tf(document, self.text_processor.tokenize))
+            self._set_category(event_id, category or UNCATEGORIZED)
+        
+        # Terms new to the model get an IDF from the counts after the whole batch
+        total_documents = len(self.term_frequencies)
+        terms = self._terms.terms
+        for event_id in batch:
+            for term_id in self.term_frequencies[event_id].term_ids:
+                term = terms[term_id]
+                if term not in self.vocabulary:
+                    self.vocabulary.add(term)
+                    self._idf[term_id] = math.log(total_documents / self._df[term_id])
+        
+        additions = {}
+        for event_id in batch:
+            vector = self._weigh_vector(self.term_frequencies[event_id])
+            self.document_vectors[event_id] = vector
+            if self.backend != "python":
+                continue
+            index = additions.setdefault(self.categories[event_id], {})
+            for term_id, weight in zip(vector.term_ids, vector.weights):
+                postings = index.get(term_id)
+                if postings is None:
+                    index[term_id] = ([event_id], [weight])
+                else:
+                    postings[0].append(event_id)
+                    postings[1].append(weight)
+        
+        for category, added in additions.items():
+            index = self.partitions.setdefault(category, {})
+            for term_id, (event_ids, weights) in added.items():
+                term = terms[term_id]
+                postings = index.get(term, new_postings())
+                index[term] = Postings(postings.event_ids + array('q', event_ids),
+                                       postings.weights + array('f', weights))
+        self._record_change(batch)
+    
+    def remove_document(self, event_id: int) -> bool:
+        """Remove a document from the fitted model. Returns False if it was not indexed."""
+        self._materialize()
+        if event_id not in self.term_frequencies:
+            return False
+        
+        self._delete(event_id)
+        del self.term_frequencies[event_id]
+        del self.document_vectors[event_id]
+        self._leave_category(event_id, self.categories.pop(event_id))
+        del self._order[event_id]
+        self._record_change((event_id,))
+        return True
+    
+    def copy(self) -> "TFIDFRecommendationEngine":
+        """
+        Copy the engine for copy-on-write updates.
+        Per-document vectors and postings are shared with the original, which
+        stays valid because updates replace them instead of mutating them.
+        """
+        self._materialize()
+        clone = copy.copy(self)
+        clone.vocabulary = set(self.vocabulary)
+        clone._terms = self._terms.copy()
+        clone._idf = array('f', self._idf)
+        clone._df = array('I', self._df)
+        clone.term_frequencies = dict(self.term_frequencies)
+        clone.document_vectors = dict(self.document_vectors)
+        clone.categories = dict(self.categories)
+        clone.partitions = {category: dict(index) for category, index in self.partitions.items()}
+        clone._category_events = {category: dict(events) for category, events in self._category_events.items()}
+        clone._order = dict(self._order)
+        clone._ann_changed = set(self._ann_changed)
+        return clone
+    
+    def _assign_order(self, event_id: int):
+        self._order[event_id] = self._next_order
+        self._next_order += 1
+    
+    def _weigh(self, tf_scores: Dict[str, float]) -> Dict[str, float]:
+        """Turn term frequencies into a normalized TF-IDF vector using the current IDF."""
+        vector = {}
+        for term, tf in tf_scores.items():
+            weight = tf * self.idf(term)
+            if weight:
+                vector[term] = weight
+        return self.normalize_vector(vector)
+    
+    def _weigh_vector(self, tf_vector: SparseVector) -> SparseVector:
+        """Compact counterpart of _weigh() for an indexed document's term frequencies."""
+        idf = self._idf
+        term_ids = []
+        weights = []
+        for term_id, tf in zip(tf_vector.term_ids, tf_vector.weights):
+            weight = tf * idf[term_id]
+            if weight:
+                term_ids.append(term_id)
+                weights.append(weight)
+        magnitude = math.sqrt(sum(weight * weight for weight in weights))
+        if magnitude == 0:
+            return empty_vector()
+        return SparseVector(array('I', term_ids), array('f', [weight / magnitude for weight in weights]))
+    
+    def _count_terms(self, tf_scores: Dict[str, float]) -> SparseVector:
+        """Intern a document's terms, count them in the document frequencies and compact its TF."""
+        terms = self._terms
+        known = terms.ids
+        term_ids = []
+        for term in tf_scores:
+            term_id = known.get(term)
+            if term_id is None:
+                term_id = terms.intern(term)
+                self._df.append(0)
+                self._idf.append(0.0)
+            term_ids.append(term_id)
+        df = self._df
+        for term_id in term_ids:
+            df[term_id] += 1
+        return SparseVector(array('I', term_ids), array('f', tf_scores.values()))
+    
+    @staticmethod
+    def _build_partitions(document_vectors: Dict[int, SparseVector], categories: Dict[int, str],
+                          terms: List[str]) -> Dict[str, Dict[str, Postings]]:
+        """Build the partitioned inverted index from scratch, collecting postings in lists first."""
+        collected = {}
+        for event_id, vector in document_vectors.items():
+            index = collected.setdefault(categories[event_id], {})
+            for term_id, weight in zip(vector.term_ids, vector.weights):
+                postings = index.get(term_id)
+                if postings is None:
+                    index[term_id] = ([event_id], [weight])
+                else:
+                    postings[0].append(event_id)
+                    postings[1].append(weight)
+        return {
+            category: {
+                terms[term_id]: Postings(array('q', event_ids), array('f', weights))
+                for term_id, (event_ids, weights) in index.items()
+            }
+            for category, index in collected.items()
+        }
+    
+    @staticmethod
+    def _group_by_category(categories: Dict[int, str]) -> Dict[str, Dict[int, None]]:
+        """Event ids of each category, in the order of `categories`."""
+        grouped = {}
+        for event_id, category in categories.items():
+            grouped.setdefault(category, {})[event_id] = None
+        return grouped
+    
+    def _set_category(self, event_id: int, category: str):
+        """Record an event's category, moving it between category member lists if it changed."""
+        previous = self.categories.get(event_id)
+        if previous == category:
+            return
+        if previous is not None:
+            self._leave_category(event_id, previous)
+        self.categories[event_id] = category
+        members = self._category_events.setdefault(category, {})
+        last = next(reversed(members), None)
+        members[event_id] = None
+        # New events come last in corpus order; one that changed category may belong further up
+        order = self._order
+        if last is not None and order[last] > order[event_id]:
+            self._category_events[category] = dict.fromkeys(sorted(members, key=order.__getitem__))
+    
+    def _leave_category(self, event_id: int, category: str):
+        members = self._category_events[category]
+        del members[event_id]
+        if not members:
+            del self._category_events[category]
+    
+    def _insert(self, event_id: int, document: Document, category: str):
+        """Tokenize a document, count its terms and add it to the index."""
+        # Corpus documents bypass the memo cache, which is kept for user profiles
+        tf_vector = self._count_terms(self._document_tf(document, self.text_processor.tokenize))
+        self.term_frequencies[event_id] = tf_vector
+        
+        # Terms new to the model get an IDF now; existing ones keep theirs until recompute_idf
+        total_documents = len(self.term_frequencies)
+        terms = self._terms.terms
+        for term_id in tf_vector.term_ids:
+            term = terms[term_id]
+            if term not in self.vocabulary:
+                self.vocabulary.add(term)
+                self._idf[term_id] = math.log(total_documents / self._df[term_id])
+        
+        vector = self._weigh_vector(tf_vector)
+        self.document_vectors[event_id] = vector
+        self._set_category(event_id, category)
+        if self.backend != "python":
+            return
+        index = self.partitions.setdefault(category, {})
+        for term_id, weight in zip(vector.term_ids, vector.weights):
+            term = terms[term_id]
+            index[term] = index.get(term, new_postings()).with_entry(event_id, weight)
+    
+    def _delete(self, event_id: int):
+        """Remove a document's postings and term counts, keeping its order slot."""
+        terms = self._terms.terms
+        if self.backend == "python":
+            category = self.categories[event_id]
+            index = self.partitions[category]
+            for term_id in self.document_vectors.get(event_id, empty_vector()).term_ids:
+                term = terms[term_id]
+                postings = index[term].without(event_id)
+                if postings is not None:
+                    index[term] = postings
+                else:
+                    del index[term]
+            if not index:
+                del self.partitions[category]
+        
+        df = self._df
+        for term_id in self.term_frequencies[event_id].term_ids:
+            df[term_id] -= 1
+            if df[term_id] == 0:
+                self.vocabulary.discard(terms[term_id])
+                self._idf[term_id] = 0.0
+    
+    def _record_change(self, event_ids: Collection[int]):
+        """Count changed documents and recompute IDF once the drift threshold is crossed."""
+        self.pending_changes += len(event_ids)
+        self._csr = None
+        if self._ann is not None:
+            self._ann_changed.update(event_ids)
         
-        # Pre-calculate TF-IDF vectors for all documents
-        self.document_vectors = []
-        for doc in documents:
-            vector = self.calculate_tfidf_vector(doc)
-            self.document_vectors.append(vector)
+        if (self.idf_drift_threshold is not None and
+                self.pending_changes > self.idf_drift_threshold * max(len(self.term_frequencies), 1)):
+            self.recompute_idf()
+    
+    def _ensure_ann(self, csr) -> Optional[IVFIndex]:
+        """Build the IVF index over the CSR corpus if approximate retrieval is on; returns it or None."""
+        if self.ann_probes <= 0 or csr is None:
+            return None
+        ann = self._ann
+        if ann is not None and ann[0] is csr:
+            return ann[1]
+        
+        corpus = csr[1]
+        if corpus.matrix.shape[0] == 0:
+            return None
+        assignment = None
+        if self._ann_centroids is None:
+            centroids = train_centroids(corpus.matrix, self.ann_lists or default_lists(corpus.matrix.shape[0]))
+            self._ann_centroids = (sorted(corpus.term_columns, key=corpus.term_columns.get), centroids)
+        else:
+            # Incremental updates only assign new and changed documents to the trained lists
+            terms, centroids = self._ann_centroids
+            centroids = align_centroids(centroids, terms, corpus.term_columns)
+            assignment = self._known_assignment(csr)
+        index = IVFIndex(centroids, corpus.matrix, assignment)
+        self._ann = (csr, index)
+        self._ann_changed = set()
+        return index
+    
+    def _known_assignment(self, csr) -> Optional["np.ndarray"]:
+        """
+        IVF list of each row of `csr` that is unchanged since the last index
+        was built, -1 for the others; None when there is no index to reuse.
+        """
+        ann = self._ann
+        if ann is None or not len(ann[0][0]):
+            return None
+        previous = np.asarray(ann[0][0], dtype=np.int64)
+        current = np.asarray(csr[0], dtype=np.int64)
+        order = np.argsort(previous, kind="stable")
+        found = order[np.minimum(np.searchsorted(previous, current, sorter=order), previous.shape[0] - 1)]
+        assignment = np.where(previous[found] == current, ann[1].assignment[found], -1).astype(np.int32)
+        if self._ann_changed:
+            changed = np.fromiter(self._ann_changed, dtype=np.int64, count=len(self._ann_changed))
+            assignment[np.isin(current, changed)] = -1
+        return assignment
+    
+    def _ensure_csr(self):
+        """Build the CSR corpus for the csr backend if it is missing; returns it or None."""
+        csr = self._csr
+        if csr is not None:
+            return csr
+        if self.backend != "csr" or not self.document_vectors:
+            return None
+        
+        event_ids = list(self.document_vectors)
+        # Columns are term ids; terms that left the vocabulary keep an empty column
+        matrix = build_csr_from_buffers(
+            [self.document_vectors[event_id] for event_id in event_ids], len(self._terms))
+        corpus = CSRCorpus.from_matrices(dict(self._terms.ids), matrix, matrix.T.tocsr())
+        category_rows = self._category_rows([self.categories[event_id] for event_id in event_ids])
+        csr = (event_ids, corpus, category_rows)
+        self._csr = csr
+        return csr
+    
+    @staticmethod
+    def _category_rows(categories: List[str]) -> Dict[str, "np.ndarray"]:
+        """Map each category to the sorted matrix rows of its events."""
+        rows = {}
+        for position, category in enumerate(categories):
+            rows.setdefault(category, []).append(position)
+        return {category: np.asarray(positions, dtype=np.int64) for category, positions in rows.items()}
+    
+    def _select_partitions(self, include_categories=None, exclude_categories=None) -> Optional[List[str]]:
+        """Categories to score for a filter, or None when the whole corpus applies."""
+        if not include_categories and not exclude_categories:
+            return None
+        selected = include_categories if include_categories else self._known_categories()
+        excluded = set(exclude_categories or ())
+        return [category for category in dict.fromkeys(selected) if category not in excluded]
+    
+    def _known_categories(self) -> List[str]:
+        """Categories with at least one event, without materializing a loaded artifact."""
+        arrays = self._arrays
+        if arrays is not None:
+            return list(arrays['categories'])
+        return list(self._category_events)
+    
+    def export_arrays(self) -> Tuple[List[str], List[str], Dict[str, "np.ndarray"]]:
+        """
+        Export the fitted state as sorted term and category tables plus flat
+        numpy arrays: event ids, category codes, IDF, and CSR arrays for term
+        frequencies and for the normalized TF-IDF matrix and its transpose.
+        Trained IVF centroids are included too, so loading skips k-means.
+        """
+        self._materialize()
+        terms = sorted(self.vocabulary)
+        # Term ids of the sorted terms; selecting these columns renumbers them
+        term_ids = np.asarray([self._terms.ids[term] for term in terms], dtype=np.int64)
+        categories = sorted(set(self.categories.values()))
+        category_codes = {category: code for code, category in enumerate(categories)}
+        event_ids = self.event_ids
+        
+        num_ids = len(self._terms)
+        tf_matrix = build_csr_from_buffers(
+            [self.term_frequencies[event_id] for event_id in event_ids], num_ids)[:, term_ids].tocsr()
+        matrix = build_csr_from_buffers(
+            [self.document_vectors[event_id] for event_id in event_ids], num_ids)[:, term_ids].tocsr()
+        matrix_t = matrix.T.tocsr()
+        matrices = [('tf', tf_matrix), ('matrix', matrix), ('matrix_t', matrix_t)]
+        if self._ann_centroids is not None:
+            # Centroid columns follow the exported term table, like the corpus matrices
+            centroid_terms, centroids = self._ann_centroids
+            matrices.append(('ann_centroids', align_centroids(
+                centroids, centroid_terms, {term: column for column, term in enumerate(terms)})))
+        
+        arrays = {
+            'event_ids': np.asarray(event_ids, dtype=np.int64),
+            'category_codes': np.asarray(
+                [category_codes[self.categories[event_id]] for event_id in event_ids], dtype=np.int32),
+            'idf': np.frombuffer(self._idf, dtype=np.float32)[term_ids].astype(np.float64),
+        }
+        for prefix, csr_matrix in matrices:
+            arrays[f'{prefix}_data'] = csr_matrix.data
+            arrays[f'{prefix}_indices'] = csr_matrix.indices
+            arrays[f'{prefix}_indptr'] = csr_matrix.indptr
+        return terms, categories, arrays
+    
+    @classmethod
+    def from_arrays(cls, terms: List[str], categories: List[str], arrays: Dict[str, "np.ndarray"],
+                    backend: str = "python", idf_drift_threshold: Optional[float] = 0.1,
+                    pending_changes: int = 0, ann_lists: Optional[int] = None,
+                    ann_probes: int = 0,
+                    field_weights: Optional[Dict[str, float]] = None) -> "TFIDFRecommendationEngine":
+        """
+        Rebuild a fitted engine from export_arrays() output without re-tokenizing.
+        With the csr backend the arrays (which may be memory-mapped) are scored
+        in place; the per-document dicts are only built if the python path or
+        an incremental update needs them.
+        """
+        if not csr_available():
+            raise ImportError("Loading a model artifact requires numpy and scipy to be installed")
+        
+        engine = cls(backend=backend, idf_drift_threshold=idf_drift_threshold,
+                     ann_lists=ann_lists, ann_probes=ann_probes, field_weights=field_weights)
+        engine.vocabulary = set(terms)
+        engine._terms = TermTable(terms)
+        engine._idf = array('f', np.asarray(arrays['idf'], dtype=np.float32).tobytes())
+        engine.pending_changes = pending_changes
+        engine._arrays = dict(arrays, terms=list(terms), categories=list(categories))
+        
+        if backend == "csr":
+            shape = (arrays['event_ids'].shape[0], len(terms))
+            matrix = sparse.csr_matrix(
+                (arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']), shape=shape
+            )
+            matrix_t = sparse.csr_matrix(
+                (arrays['matrix_t_data'], arrays['matrix_t_indices'], arrays['matrix_t_indptr']),
+                shape=(shape[1], shape[0])
+            )
+            term_columns = {term: column for column, term in enumerate(terms)}
+            codes = arrays['category_codes']
+            category_rows = {
+                category: np.flatnonzero(codes == code) for code, category in enumerate(categories)
+            }
+            engine._csr = (
+                engine.event_ids,
+                CSRCorpus.from_matrices(term_columns, matrix, matrix_t),
+                category_rows
+            )
+            if 'ann_centroids_data' in arrays:
+                indptr = arrays['ann_centroids_indptr']
+                centroids = sparse.csr_matrix(
+                    (arrays['ann_centroids_data'], arrays['ann_centroids_indices'], indptr),
+                    shape=(indptr.shape[0] - 1, len(terms))
+                )
+                # Reused unless ANN_LISTS now asks for another number of lists
+                if ann_lists is None or centroids.shape[0] == ann_lists:
+                    engine._ann_centroids = (list(terms), centroids)
+            engine._ensure_ann(engine._csr)
+        else:
+            engine._materialize()
+        return engine
+    
+    def _materialize(self):
+        """Expand loaded artifact arrays into the per-document dicts and postings."""
+        if self._arrays is None:
+            return
+        with self._materialize_lock:
+            arrays = self._arrays
+            if arrays is None:
+                return
+            
+            # Term ids of the table built in from_arrays() are the artifact's columns
+            terms = arrays['terms']
+            event_ids = arrays['event_ids'].tolist()
+            term_frequencies = self._rows_to_vectors(
+                event_ids, arrays['tf_data'], arrays['tf_indices'], arrays['tf_indptr'])
+            document_vectors = self._rows_to_vectors(
+                event_ids, arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr'])
+            document_frequency = np.bincount(np.asarray(arrays['tf_indices']), minlength=len(terms))
+            
+            category_names = arrays['categories']
+            categories = {
+                event_id: category_names[code]
+                for event_id, code in zip(event_ids, arrays['category_codes'].tolist())
+            }
+            
+            partitions = {}
+            if self.backend == "python":
+                partitions = self._build_partitions(document_vectors, categories, terms)
+            category_events = self._group_by_category(categories)
+            
+            self.term_frequencies = term_frequencies
+            self.document_vectors = document_vectors
+            self._df = array('I', document_frequency.astype(np.uint32).tobytes())
+            self.categories = categories
+            self.partitions = partitions
+            self._category_events = category_events
+            self._order = {event_id: position for position, event_id in enumerate(event_ids)}
+            self._next_order = len(event_ids)
+            self._arrays = None
+    
+    @staticmethod
+    def _rows_to_vectors(event_ids, data, indices, indptr) -> Dict[int, SparseVector]:
+        data = np.asarray(data, dtype=np.float32)
+        indices = np.asarray(indices, dtype=np.uint32)
+        indptr = indptr.tolist()
+        return {
+            event_id: SparseVector(
+                array('I', indices[indptr[row]:indptr[row + 1]].tobytes()),
+                array('f', data[indptr[row]:indptr[row + 1]].tobytes())
+            )
+            for row, event_id in enumerate(event_ids)
+        }
     
     def get_recommendations(self, user_profile: str, event_documents: List[str], 
                           event_ids: List[int], limit: int = 10) -> List[Tuple[int, float]]:
@@ -118,3 +809,210 @@ class TFIDFRecommendationEngine:
         # Sort by similarity score (descending) and return top results
         similarities.sort(key=lambda x: x[1], reverse=True)
         return similarities[:limit]
+    
+    def vectorize_profile(self, user_profile: str,
+                          timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Build the normalized TF-IDF vector of a user profile under the current IDF.
+        Seconds spent tokenizing and weighing are added to `timings` under
+        "tokenization" and "vectorization".
+        """
+        return self.weigh_profile(self.profile_terms(user_profile, timings), timings)
+    
+    def profile_terms(self, user_profile: str,
+                      timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Term frequencies of a user profile. They depend only on the text, so
+        they stay valid across refits and can be weighed again by weigh_profile().
+        """
+        started = time.perf_counter()
+        tf_scores = self.calculate_tf(self.text_processor.preprocess_text(user_profile))
+        if timings is not None:
+            _add_timing(timings, 'tokenization', time.perf_counter() - started)
+        return tf_scores
+    
+    def weigh_profile(self, tf_scores: Dict[str, float],
+                      timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Normalized TF-IDF vector of profile term frequencies under the current IDF."""
+        started = time.perf_counter()
+        vector = self._weigh(tf_scores)
+        if timings is not None:
+            _add_timing(timings, 'vectorization', time.perf_counter() - started)
+        return vector
+    
+    def get_indexed_recommendations(self, user_profile: str, limit: int = 10,
+                                    include_categories: Optional[List[str]] = None,
+                                    exclude_categories: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Get event recommendations for the fitted corpus using the inverted index.
+        Only the postings of the user's own terms are visited, so the cost depends
+        on how many events share a term with the profile rather than on the
+        size of the vocabulary. Scores match cosine_similarity up to the float32
+        rounding of the stored weights.
+        Category filters restrict scoring to the matching partitions.
+        Returns list of (event_id, similarity_score) tuples.
+        """
+        if limit <= 0:
+            return []
+        return self.rank_vector(self.vectorize_profile(user_profile), limit,
+                                include_categories, exclude_categories)
+    
+    def rank_vector(self, user_vector: Dict[str, float], limit: int = 10,
+                    include_categories: Optional[List[str]] = None,
+                    exclude_categories: Optional[List[str]] = None,
+                    timings: Optional[Dict[str, float]] = None,
+                    shards=None) -> List[Tuple[int, float]]:
+        """
+        Rank the fitted corpus (or the filtered categories) against a vector from vectorize_profile().
+        Seconds spent scoring and selecting the top k are added to `timings`
+        under "scoring" and "top_k". With ann_probes set, only the documents in
+        the closest IVF lists are scored (approximate, exact scores); otherwise
+        `shards` (a ShardedCorpus exported from this engine) moves exact
+        scoring into its worker processes.
+        """
+        if limit <= 0:
+            return []
+        
+        selected = self._select_partitions(include_categories, exclude_categories)
+        csr = self._ensure_csr()
+        ann = self._ensure_ann(csr)
+        if ann is not None:
+            return self._ann_recommendations(csr, ann, [user_vector], limit, selected, timings)[0]
+        if shards is not None:
+            return shards.top_k([user_vector], limit, selected, timings)[0]
+        
+        if csr is not None:
+            return self._csr_recommendations(csr, [user_vector], limit, selected, timings)[0]
+        
+        self._materialize()
+        started = time.perf_counter()
+        if selected is None:
+            indexes = list(self.partitions.values())
+        else:
+            indexes = [self.partitions[category] for category in selected if category in self.partitions]
+        
+        # Accumulate dot products over the postings of the user's terms
+        scores = {}
+        for index in indexes:
+            for term, user_weight in user_vector.items():
+                postings = index.get(term)
+                if postings is None:
+                    continue
+                for event_id, doc_weight in zip(postings.event_ids, postings.weights):
+                    scores[event_id] = scores.get(event_id, 0) + user_weight * doc_weight
+        scored = time.perf_counter()
+        
+        # Ties keep corpus order, like the stable sort in get_recommendations
+        order = self._order
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -order[item[0]]))
+        
+        # Pad with zero-scored events in corpus order, as the exhaustive ranking does;
+        # filtered queries only look at the events of their own categories
+        if len(top) < limit:
+            if selected is None:
+                for event_id in self.document_vectors:
+                    if len(top) >= limit:
+                        break
+                    if event_id not in scores:
+                        top.append((event_id, 0))
+            else:
+                members = self._category_events
+                merged = heapq.merge(*(members[category] for category in selected if category in members),
+                                     key=order.__getitem__)
+                for event_id in merged:
+                    if len(top) >= limit:
+                        break
+                    if event_id not in scores:
+                        top.append((event_id, 0))
+        
+        if timings is not None:
+            _add_timing(timings, 'scoring', scored - started)
+            _add_timing(timings, 'top_k', time.perf_counter() - scored)
+        return top
+    
+    def get_batch_recommendations(self, user_profiles: List[str], limit: int = 10,
+                                  include_categories: Optional[List[str]] = None,
+                                  exclude_categories: Optional[List[str]] = None,
+                                  timings: Optional[Dict[str, float]] = None,
+                                  shards=None) -> List[List[Tuple[int, float]]]:
+        """
+        Get indexed recommendations for many user profiles at once.
+        The csr backend scores the whole batch with one sparse matrix product;
+        the python backend scores each profile through the inverted index;
+        `shards` spreads the batch over the processes of a ShardedCorpus.
+        With ann_probes set, candidates come from the IVF index instead.
+        Stage durations for the whole batch are summed into `timings`.
+        Returns one list of (event_id, similarity_score) tuples per profile.
+        """
+        if limit <= 0:
+            return [[] for _ in user_profiles]
+        
+        user_vectors = [self.vectorize_profile(profile, timings) for profile in user_profiles]
+        return self.rank_vectors(user_vectors, limit, include_categories, exclude_categories, timings, shards)
+    
+    def rank_vectors(self, user_vectors: List[Dict[str, float]], limit: int = 10,
+                     include_categories: Optional[List[str]] = None,
+                     exclude_categories: Optional[List[str]] = None,
+                     timings: Optional[Dict[str, float]] = None,
+                     shards=None) -> List[List[Tuple[int, float]]]:
+        """
+        Batch counterpart of rank_vector() for vectors from vectorize_profile()
+        or weigh_profile(), scored the same way as get_batch_recommendations().
+        """
+        if limit <= 0:
+            return [[] for _ in user_vectors]
+        
+        selected = self._select_partitions(include_categories, exclude_categories)
+        csr = self._ensure_csr()
+        ann = self._ensure_ann(csr)
+        if ann is not None:
+            return self._ann_recommendations(csr, ann, user_vectors, limit, selected, timings)
+        if shards is not None:
+            return shards.top_k(user_vectors, limit, selected, timings)
+        
+        if csr is None:
+            return [
+                self.rank_vector(user_vector, limit, include_categories, exclude_categories, timings)
+                for user_vector in user_vectors
+            ]
+        
+        return self._csr_recommendations(csr, user_vectors, limit, selected, timings)
+    
+    def _selected_rows(self, csr, selected: Optional[List[str]]) -> Optional["np.ndarray"]:
+        """Sorted matrix rows of the selected categories, or None for the whole corpus."""
+        if selected is None:
+            return None
+        selections = self._row_selections
+        if selections is None or selections[0] is not csr:
+            selections = self._row_selections = (csr, {})
+        key = tuple(sorted(selected))
+        rows = selections[1].get(key)
+        if rows is None:
+            category_rows = csr[2]
+            parts = [category_rows[category] for category in key if category in category_rows]
+            rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            if len(selections[1]) >= MAX_ROW_SELECTIONS:
+                selections[1].clear()
+            selections[1][key] = rows
+        return rows
+    
+    def _csr_recommendations(self, csr, user_vectors: List[Dict[str, float]], limit: int,
+                             selected: Optional[List[str]] = None,
+                             timings: Optional[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """Score normalized user vectors with the CSR corpus and map rows to event ids."""
+        event_ids, corpus, _ = csr
+        return [
+            [(event_ids[position], score) for position, score in ranked]
+            for ranked in corpus.top_k(user_vectors, limit, self._selected_rows(csr, selected), timings)
+        ]
+    
+    def _ann_recommendations(self, csr, ann: IVFIndex, user_vectors: List[Dict[str, float]], limit: int,
+                             selected: Optional[List[str]] = None,
+                             timings: Optional[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """Probe the IVF index, re-rank its candidates exactly and map rows to event ids."""
+        event_ids, corpus, _ = csr
+        rows = self._selected_rows(csr, selected)
+        return [
+            [(event_ids[position], score) for position, score in ranked]
+            for ranked in ann.top_k(user_vectors, corpus.term_columns, limit, self.ann_probes, rows, timings)
+        ]
@@ -3,49 +3,399 @@
 from database_operations import DatabaseOperations
 from recommendation_engine import TFIDFRecommendationEngine
 from models import EventResponse
-from typing import List, Optional
+from database import POOL_CONFIG
+from config import (
+    RECOMMENDER_BACKEND, IDF_DRIFT_THRESHOLD, SCORING_WORKERS, MAX_INFLIGHT_REQUESTS,
+    MODEL_ARTIFACT_DIR, DOCUMENT_FIELD_WEIGHTS,
+    CACHE_URL, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS,
+    USER_PROFILE_MAX_ENTRIES, USER_PROFILE_TTL_SECONDS,
+    SCORING_PROCESSES, SHARDED_MIN_EVENTS, SHARD_DIR, SHARD_EXPORT_MIN_AGE_SECONDS,
+    ANN_LISTS, ANN_PROBES
+)
+from model_store import load_model, save_model
+from cache import create_cache
+from profile_store import UserProfileStore
+from sharded_scoring import ShardedScorer, ShardedCorpus
+from csr_backend import is_available as numpy_available
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Mapping
+import asyncio
 import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
 
 # Rest of your RecommendationService class...
 
+def _encode_cache_entry(entry: dict) -> dict:
+    """A cached user entry as JSON-compatible data; query tuples become lists."""
+    return {
+        'version': entry['version'],
+        'results': [
+            [limit, list(include), list(exclude), [event.model_dump() for event in events]]
+            for (limit, include, exclude), events in entry['results'].items()
+        ]
+    }
+
+
+def _decode_cache_entry(data: dict) -> dict:
+    return {
+        'version': data['version'],
+        'results': {
+            (limit, tuple(include), tuple(exclude)): [EventResponse(**event) for event in events]
+            for limit, include, exclude, events in data['results']
+        }
+    }
+
+
+class ServiceOverloaded(Exception):
+    """Raised when a request arrives while MAX_INFLIGHT_REQUESTS are already admitted."""
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """
+    Immutable view of the fitted corpus served by the request path.
+    The engine holds the precomputed vectors and index for exactly these
+    events; it must not be mutated once the snapshot is published.
+    """
+    engine: TFIDFRecommendationEngine
+    event_ids: Tuple[int, ...]
+    events_by_id: Mapping[int, Mapping]
+    # Identifies the model in cache keys; equal versions give equal rankings
+    version: str
+
+
 class RecommendationService:
-    def __init__(self):
-        self.engine = TFIDFRecommendationEngine()
-        self.db = DatabaseOperations()
-        self.is_model_fitted = False
+    def __init__(self, db=None):
+        # Engine settings are checked up front: a fit swallows its errors, so an
+        # invalid combination would otherwise only show up as empty results
+        self._create_engine()
+        # Anything with the DatabaseOperations interface, e.g. an in-memory stand-in
+        self.db = db if db is not None else DatabaseOperations()
+        # Replaced wholesale on refit; readers grab the reference once per request
+        self._snapshot: Optional[ModelSnapshot] = None
+        # Serializes publishing and incremental updates; readers never take it
+        self._update_lock = threading.RLock()
+        # Event changes applied during each running fit, replayed onto its
+        # engine before publishing so they are not lost; guarded by _update_lock
+        self._refit_changes: Dict[int, List[Tuple[List[Dict], List[int]]]] = {}
+        # Blocking database calls from the async path; more threads than pooled
+        # connections would only queue inside the pool
+        self._db_executor = ThreadPoolExecutor(
+            max_workers=POOL_CONFIG['max_size'], thread_name_prefix="recommender-db"
+        )
+        # CPU-bound scoring from the async path; its size is the concurrency limit
+        self._scoring_executor = ThreadPoolExecutor(
+            max_workers=SCORING_WORKERS, thread_name_prefix="recommender-scoring"
+        )
+        # Uncached async requests admitted and not yet finished; only touched on the event loop
+        self._admitted = 0
+        # (user id, query, model version) -> task computing it, shared by identical requests
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        # Per-user results, tagged with the model version; entries of older
+        # versions are never served and get overwritten, so publishing does not clear them
+        self._cache = create_cache(CACHE_URL, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS,
+                                   encode=_encode_cache_entry, decode=_decode_cache_entry)
+        # Per-user interest vectors; unlike results they outlive model versions
+        self._profiles = UserProfileStore(
+            create_cache(CACHE_URL, USER_PROFILE_MAX_ENTRIES, USER_PROFILE_TTL_SECONDS,
+                         prefix="recommender-profile:"),
+            USER_PROFILE_TTL_SECONDS
+        )
+        # Events watermark of the last full fit, compared by the background refresher
+        self._fitted_watermark: Optional[str] = None
+        # Only one refresh runs at a time; others report its status instead
+        self._refresh_lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        self._refresh_status = {
+            "state": "idle",
+            "last_outcome": None,
+            "last_error": None,
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None,
+            "refreshes": 0,
+            "model_version": None,
+        }
+        self._refresher: Optional[threading.Thread] = None
+        self._refresher_stop = threading.Event()
+        # Worker processes scoring shards of large catalogs, when configured
+        self._sharded = self._create_sharded_scorer()
+        self._register_metrics()
         self._fit_model()
     
-    def _fit_model(self):
-        """Initialize and fit the TF-IDF model with all events."""
+    @property
+    def is_model_fitted(self) -> bool:
+        return self._snapshot is not None
+    
+    @property
+    def engine(self) -> Optional[TFIDFRecommendationEngine]:
+        snapshot = self._snapshot
+        return snapshot.engine if snapshot else None
+    
+    @staticmethod
+    def _build_document(event: Mapping) -> Dict[str, str]:
+        """
+        Title, description, and category as separate fields, weighed by
+        DOCUMENT_FIELD_WEIGHTS when indexed. Empty when every field is blank.
+        """
+        # Ensure all fields are strings and handle None values; the tokenizer lowercases
+        fields = {
+            'title': str(event.get('title', '')),
+            'description': str(event.get('description', '')),
+            'category': str(event.get('category_name', '')),
+        }
+        return {field: text for field, text in fields.items() if text.strip()}
+    
+    @staticmethod
+    def _normalize_category(category) -> str:
+        """Category key used for index partitions and request filters."""
+        return str(category or '').strip().lower()
+    
+    @classmethod
+    def _normalize_categories(cls, categories: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        """Normalize a request filter into a sorted tuple; empty means no filter."""
+        if not categories:
+            return ()
+        return tuple(sorted({cls._normalize_category(category) for category in categories}))
+    
+    def _publish(self, engine: TFIDFRecommendationEngine, events_by_id: Dict[int, Mapping],
+                 version: Optional[str] = None):
+        """Swap in a new snapshot for a fitted engine and its event rows."""
+        self._snapshot = ModelSnapshot(
+            engine=engine,
+            event_ids=tuple(engine.event_ids),
+            events_by_id=MappingProxyType(events_by_id),
+            version=version or uuid.uuid4().hex
+        )
+    
+    def _fit_model(self, watermark: Optional[str] = None) -> bool:
+        """
+        Fit a new TF-IDF model with all events and publish it as the current snapshot.
+        The model is built without holding the update lock, so incremental
+        updates keep flowing meanwhile. Returns whether a model was published.
+        """
+        started = time.perf_counter()
+        changes = []
+        with self._update_lock:
+            self._refit_changes[id(changes)] = changes
         try:
-            events = self.db.get_all_events()
-            if not events:
-                logging.warning("No events found in database for model fitting")
-                return
+            # Taken before reading events, so a concurrent change makes the fit look stale
+            if watermark is None:
+                watermark = self.db.get_events_watermark()
+            if watermark is not None and MODEL_ARTIFACT_DIR:
+                loaded = self._load_artifact(watermark)
+                if loaded is not None:
+                    engine, rows = loaded
+                    self._publish_fit(engine, rows, watermark, changes)
+                    logging.info(f"TF-IDF model loaded from {MODEL_ARTIFACT_DIR} with {len(rows)} events")
+                    metrics.FITS.inc(outcome="loaded")
+                    return True
             
-            # Combine title, description, and category for each event
-            documents = []
-            for event in events:
-                # Ensure all fields are strings and handle None values
-                title = str(event.get('title', '')).lower()
-                description = str(event.get('description', '')).lower()
-                category = str(event.get('category_name', '')).lower()
-                
-                doc = f"{title} {description} {category}".strip()
-                if doc:  # Only add non-empty documents
-                    documents.append(doc)
+            # Rows stream from a server-side cursor straight into the fit;
+            # only the event rows served in responses are kept
+            rows = {}
+            engine = self._create_engine()
+            # Fit the TF-IDF model off to the side, then swap it in
+            events = metrics.timed_iter(self.db.iter_events(), "event_load")
+            engine.fit_records(self._iter_records(events, rows))
+            
+            if rows:
+                self._publish_fit(engine, rows, watermark, changes)
+                metrics.FIT_SECONDS.observe(time.perf_counter() - started)
+                metrics.FITS.inc(outcome="fitted")
+                logging.info(f"TF-IDF model fitted with {len(rows)} events")
+                if watermark is not None and MODEL_ARTIFACT_DIR:
+                    self._save_artifact(engine, rows, watermark)
+                return True
+            
+            metrics.FITS.inc(outcome="empty")
+            logging.warning("No events with valid documents found for model fitting")
+            return False
             
-            if documents:
-                # Fit the TF-IDF model
-                self.engine.fit(documents)
-                self.is_model_fitted = True
-                print(f"✅ TF-IDF model fitted successfully with {len(documents)} events")
-            else:
-                print("❌ No valid documents found for model fitting")
-                
         except Exception as e:
-            print(f"❌ Error fitting model: {e}")
+            metrics.FITS.inc(outcome="failed")
             logging.error(f"Model fitting error: {e}", exc_info=True)
+            return False
+        finally:
+            with self._update_lock:
+                self._refit_changes.pop(id(changes), None)
+    
+    def _publish_fit(self, engine: TFIDFRecommendationEngine, rows: Dict[int, Mapping],
+                     watermark: Optional[str], changes: List[Tuple[List[Dict], List[int]]]):
+        """
+        Publish a fitted or loaded engine. Event changes applied while it was
+        built are replayed onto a copy first, leaving `engine` and `rows` as
+        fitted so they can still be saved under `watermark`.
+        """
+        with self._update_lock:
+            version = watermark
+            if changes:
+                engine = engine.copy()
+                rows = dict(rows)
+                for upserted_events, removed_event_ids in changes:
+                    self._apply_changes(engine, rows, upserted_events, removed_event_ids)
+                engine._ensure_ann(engine._ensure_csr())
+                # The replayed model no longer matches the watermark's events
+                version = None
+            self._publish(engine, rows, version=version)
+            self._fitted_watermark = watermark
+            self._refit_changes.pop(id(changes), None)
+    
+    @staticmethod
+    def _create_engine() -> TFIDFRecommendationEngine:
+        """
+        An unfitted engine with the configured settings. Raises ValueError or
+        ImportError for a backend or ANN setting that cannot work.
+        """
+        return TFIDFRecommendationEngine(
+            backend=RECOMMENDER_BACKEND,
+            idf_drift_threshold=IDF_DRIFT_THRESHOLD,
+            ann_lists=ANN_LISTS,
+            ann_probes=ANN_PROBES,
+            field_weights=DOCUMENT_FIELD_WEIGHTS
+        )
+    
+    def _iter_records(self, events: Iterable[Dict],
+                      rows: Dict[int, Mapping]) -> Iterator[Tuple[int, Dict[str, str], str]]:
+        """
+        Turn event rows into (event id, document, category) records for
+        fit_records(), collecting the rows of indexed events into `rows`.
+        """
+        for event in events:
+            # Title, description, and category become the fields of one document
+            doc = self._build_document(event)
+            if doc:  # Only add non-empty documents
+                rows[event['id']] = MappingProxyType(event)
+                yield event['id'], doc, self._normalize_category(event.get('category_name'))
+    
+    def _load_artifact(self, watermark: str) -> Optional[Tuple[TFIDFRecommendationEngine, Dict[int, Mapping]]]:
+        """The persisted engine and its event rows, if they match the events watermark."""
+        try:
+            loaded = load_model(
+                MODEL_ARTIFACT_DIR, watermark,
+                backend=RECOMMENDER_BACKEND,
+                idf_drift_threshold=IDF_DRIFT_THRESHOLD,
+                ann_lists=ANN_LISTS,
+                ann_probes=ANN_PROBES,
+                field_weights=DOCUMENT_FIELD_WEIGHTS
+            )
+        except Exception as e:
+            logging.warning(f"Could not load model artifact: {e}", exc_info=True)
+            return None
+        if loaded is None:
+            return None
+        
+        engine, events = loaded
+        return engine, {event['id']: MappingProxyType(event) for event in events}
+    
+    def _save_artifact(self, engine: TFIDFRecommendationEngine, rows: Dict[int, Mapping], watermark: str):
+        """Persist a freshly fitted model; failures only cost the next worker a refit."""
+        try:
+            save_model(MODEL_ARTIFACT_DIR, engine, [rows[event_id] for event_id in engine.event_ids], watermark)
+        except Exception as e:
+            logging.warning(f"Could not save model artifact: {e}", exc_info=True)
+    
+    def apply_event_changes(self, upserted_events: Iterable[Dict] = (), removed_event_ids: Iterable[int] = ()):
+        """
+        Apply created, updated and deleted events to the model without a full refit.
+        The current engine is copied, updated and published as a new snapshot, so
+        requests in flight keep scoring against the previous one. The CSR corpus
+        and IVF lists are rebuilt here, under the update lock, never by a request.
+        """
+        upserted_events = list(upserted_events)
+        removed_event_ids = list(removed_event_ids)
+        with self._update_lock:
+            for changes in self._refit_changes.values():
+                changes.append((upserted_events, removed_event_ids))
+            snapshot = self._snapshot
+            if snapshot is not None:
+                engine = snapshot.engine.copy()
+                rows = dict(snapshot.events_by_id)
+                self._apply_changes(engine, rows, upserted_events, removed_event_ids)
+                # Build the scoring structures before readers can see the engine
+                engine._ensure_ann(engine._ensure_csr())
+                self._publish(engine, rows)
+                return
+        
+        # Nothing to update incrementally yet; the events are already in the database
+        self._fit_model()
+    
+    def _apply_changes(self, engine: TFIDFRecommendationEngine, rows: Dict[int, Mapping],
+                       upserted_events: List[Dict], removed_event_ids: List[int]):
+        """Apply event changes to an unpublished engine and its event rows."""
+        for event_id in removed_event_ids:
+            engine.remove_document(event_id)
+            rows.pop(event_id, None)
+        
+        # One engine update for the whole batch; the last row wins when an id repeats
+        records = []
+        for event in {event['id']: event for event in upserted_events}.values():
+            doc = self._build_document(event)
+            if doc:
+                records.append((event['id'], doc, self._normalize_category(event.get('category_name'))))
+                rows[event['id']] = MappingProxyType(dict(event))
+            elif engine.remove_document(event['id']):
+                rows.pop(event['id'], None)
+        engine.add_documents(records)
+    
+    def create_event(self, title: str, description: str, category_name: str) -> int:
+        """Insert a new event and make it recommendable right away."""
+        event_id = self.db.create_event(title, description, category_name)
+        self.add_event({
+            'id': event_id,
+            'title': title,
+            'description': description,
+            'category_name': category_name
+        })
+        return event_id
+    
+    def create_events(self, events: List[Dict]) -> List[int]:
+        """
+        Insert many events in one transaction and index them with a single
+        model update. Returns the new ids in input order. The rows are stored
+        once the insert commits; if indexing then fails, the ids are still
+        returned and the background refresher picks the events up.
+        """
+        if not events:
+            return []
+        event_ids = self.db.create_events(events)
+        try:
+            self.apply_event_changes(upserted_events=[
+                {
+                    'id': event_id,
+                    'title': event['title'],
+                    'description': event['description'],
+                    'category_name': event['category_name']
+                }
+                for event_id, event in zip(event_ids, events)
+            ])
+        except Exception as e:
+            # Failing the request now would make a retry insert the events again
+            logging.error(f"Indexing {len(event_ids)} stored events failed: {e}", exc_info=True)
+        return event_ids
+    
+    async def create_events_async(self, events: List[Dict]) -> List[int]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, self.create_events, events)
+    
+    def add_event(self, event: Dict):
+        """Hook for a newly created event row."""
+        self.apply_event_changes(upserted_events=[event])
+    
+    def update_event(self, event: Dict):
+        """Hook for an updated event row."""
+        self.apply_event_changes(upserted_events=[event])
+    
+    def remove_event(self, event_id: int):
+        """Hook for a deleted event."""
+        self.apply_event_changes(removed_event_ids=[event_id])
     
     def _process_user_interests(self, raw_interests) -> Optional[str]:
         """Process user interests to handle different formats."""
@@ -65,102 +415,502 @@ class RecommendationService:
             return processed.strip() if processed.strip() else None
             
         except Exception as e:
-            print(f"Error processing user interests: {e}")
+            logging.warning(f"Error processing user interests: {e}")
             return None
     
-    def get_user_recommendations(self, user_id: int, limit: int = 10) -> List[EventResponse]:
-        """Get personalized event recommendations for a user."""
-        if not self.is_model_fitted:
-            print("⚠️  Model not fitted, attempting to fit model...")
+    def _ensure_snapshot(self) -> Optional[ModelSnapshot]:
+        """Return the current snapshot, fitting the model first if there is none."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            logging.warning("Model not fitted, attempting to fit model...")
             self._fit_model()
-            if not self.is_model_fitted:
-                return []
+            snapshot = self._snapshot
+        return snapshot
+    
+    @staticmethod
+    def _create_sharded_scorer() -> Optional[ShardedScorer]:
+        if SCORING_PROCESSES <= 1:
+            return None
+        if ANN_PROBES > 0:
+            logging.warning("SCORING_PROCESSES is ignored while approximate retrieval (ANN_PROBES) is on")
+            return None
+        if not numpy_available():
+            logging.warning("SCORING_PROCESSES is set but numpy/scipy are not installed; scoring in-process")
+            return None
+        directory = SHARD_DIR or os.path.join(tempfile.gettempdir(), f"recommender-shards-{os.getpid()}")
+        return ShardedScorer(SCORING_PROCESSES, directory, SHARD_EXPORT_MIN_AGE_SECONDS)
+    
+    def _shards_for(self, snapshot: ModelSnapshot) -> Optional[ShardedCorpus]:
+        """Sharded corpus for a large snapshot once its export is ready, else None (score in-process)."""
+        if self._sharded is None or len(snapshot.event_ids) < SHARDED_MIN_EVENTS:
+            return None
+        return self._sharded.corpus_for(snapshot.engine, snapshot.version, snapshot.event_ids)
+    
+    def _to_event_responses(self, snapshot: ModelSnapshot,
+                            recommendations: List[Tuple[int, float]]) -> List[EventResponse]:
+        """Convert (event_id, similarity_score) pairs into response events."""
+        started = time.perf_counter()
+        result = []
+        for event_id, similarity_score in recommendations:
+            event = snapshot.events_by_id.get(event_id)
+            if event is not None and similarity_score > 0:
+                result.append(EventResponse(
+                    id=event['id'],
+                    title=event['title'],
+                    description=event['description'],
+                    category_name=event['category_name'],
+                    similarity_score=round(similarity_score, 4)
+                ))
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="response_building")
+        return result
+    
+    def _score(self, snapshot: ModelSnapshot, user_id: int, user_vector: Dict[str, float],
+               limit: int, include: Tuple[str, ...] = (), exclude: Tuple[str, ...] = ()) -> List[EventResponse]:
+        """Score a user vector against a snapshot and build the response events."""
+        # Score against the fitted corpus; events are never re-read per request
+        timings = {}
+        recommendations = snapshot.engine.rank_vector(
+            user_vector, limit, include, exclude, timings, self._shards_for(snapshot)
+        )
+        metrics.observe_stages(timings)
+        metrics.USERS_SCORED.inc()
+        
+        return self._to_event_responses(snapshot, recommendations)
+    
+    @staticmethod
+    def _cache_key(user_id: int) -> str:
+        return f"user:{user_id}"
+    
+    def _cached_user(self, snapshot: ModelSnapshot, user_id: int) -> Optional[dict]:
+        """Return the user's cache entry if it was built for this snapshot's model."""
+        entry = self._cache.get(self._cache_key(user_id))
+        if entry is not None and entry['version'] == snapshot.version:
+            return entry
+        return None
+    
+    def _profile_vector(self, snapshot: ModelSnapshot, user_id: int) -> Optional[Dict[str, float]]:
+        """The user's stored vector under this snapshot's model, or None if interests must be read."""
+        timings = {}
+        user_vector = self._profiles.vector(user_id, snapshot.engine, snapshot.version, timings)
+        metrics.observe_stages(timings)
+        return user_vector
+    
+    def _build_profile(self, snapshot: ModelSnapshot, user_id: int, raw_interests) -> Dict[str, float]:
+        """Store the profile of freshly read interests; users without interests get an empty vector."""
+        user_interests = self._process_user_interests(raw_interests)
+        if not user_interests:
+            logging.debug(f"No valid interests found for user {user_id}")
+        
+        timings = {}
+        user_vector = self._profiles.build(user_id, user_interests, snapshot.engine, snapshot.version, timings)
+        metrics.observe_stages(timings)
+        return user_vector
+    
+    def _user_vector(self, snapshot: ModelSnapshot, user_id: int) -> Dict[str, float]:
+        """The user's vector from the profile store, reading the interests only on a miss."""
+        user_vector = self._profile_vector(snapshot, user_id)
+        if user_vector is None:
+            user_vector = self._build_profile(snapshot, user_id, self._lookup_interests(user_id))
+        return user_vector
+    
+    def _user_vectors(self, snapshot: ModelSnapshot, user_ids: List[int]) -> Dict[int, Dict[str, float]]:
+        """Vectors of many users; the interests of users without a stored profile are read in one query."""
+        vectors = {}
+        missing = []
+        for user_id in user_ids:
+            user_vector = self._profile_vector(snapshot, user_id)
+            if user_vector is None:
+                missing.append(user_id)
+            else:
+                vectors[user_id] = user_vector
+        if missing:
+            raw_interests = self._lookup_users_interests(missing)
+            for user_id in missing:
+                vectors[user_id] = self._build_profile(snapshot, user_id, raw_interests.get(user_id))
+        return vectors
+    
+    def _lookup_interests(self, user_id: int):
+        """Read one user's interests, timed as the interest_lookup stage."""
+        with metrics.stage("interest_lookup"):
+            return self.db.get_user_interests(user_id)
+    
+    def _lookup_users_interests(self, user_ids: List[int]) -> Dict[int, object]:
+        """Read many users' interests in one query, timed as the interest_lookup stage."""
+        with metrics.stage("interest_lookup"):
+            return self.db.get_users_interests(user_ids)
+    
+    @staticmethod
+    def _record_result(result: List[EventResponse]) -> List[EventResponse]:
+        if not result:
+            metrics.EMPTY_RESULTS.inc()
+        return result
+    
+    def _score_and_cache(self, snapshot: ModelSnapshot, user_id: int, user_vector: Dict[str, float],
+                         query: Tuple, entry: Optional[dict]) -> List[EventResponse]:
+        """
+        Score a user vector and remember the result.
+        `query` is (limit, include, exclude) and keys the cached result.
+        """
+        result = self._score(snapshot, user_id, user_vector, *query) if user_vector else []
+        
+        results = dict(entry['results']) if entry else {}
+        results[query] = result
+        self._cache.set(self._cache_key(user_id), {
+            'version': snapshot.version,
+            'results': results
+        })
+        return result
+    
+    def invalidate_user(self, user_id: int):
+        """Hook for changed user interests: drop the user's profile and cached results."""
+        self._profiles.invalidate(user_id)
+        self._cache.delete(self._cache_key(user_id))
+    
+    async def invalidate_user_async(self, user_id: int):
+        """Async variant of invalidate_user for the API; cache deletes may be network calls."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._db_executor, self.invalidate_user, user_id)
+    
+    def precompute_profiles(self) -> dict:
+        """
+        Build the profile of every user from one streamed query, so later
+        requests only score. Returns the number of profiles and the duration.
+        """
+        started = time.perf_counter()
+        snapshot = self._ensure_snapshot()
+        if snapshot is None:
+            return {"profiles": 0, "duration_seconds": 0.0}
+        
+        count = 0
+        for user_id, raw_interests in self.db.iter_users_interests():
+            self._build_profile(snapshot, user_id, raw_interests)
+            count += 1
+        duration = time.perf_counter() - started
+        logging.info(f"Precomputed {count} user profiles in {duration:.2f} s")
+        return {"profiles": count, "duration_seconds": round(duration, 6)}
+    
+    async def precompute_profiles_async(self) -> dict:
+        """Async variant of precompute_profiles for the API; it runs on the database pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, self.precompute_profiles)
+    
+    def cache_stats(self) -> dict:
+        """Hit, miss and eviction counters of the recommendation cache."""
+        return self._cache.stats()
+    
+    def _score_batch(self, snapshot: ModelSnapshot, user_ids: List[int], user_vectors: Dict[int, Dict[str, float]],
+                     limit: int, include: Tuple[str, ...] = (),
+                     exclude: Tuple[str, ...] = ()) -> Dict[int, List[EventResponse]]:
+        """Score many users' vectors against a snapshot in one engine call."""
+        results = {user_id: [] for user_id in user_ids}
+        vectors = {user_id: user_vectors[user_id] for user_id in user_ids if user_vectors.get(user_id)}
+        
+        timings = {}
+        ranked = snapshot.engine.rank_vectors(
+            list(vectors.values()), limit, include, exclude, timings, self._shards_for(snapshot)
+        )
+        metrics.observe_stages(timings)
+        metrics.USERS_SCORED.inc(len(vectors))
+        for user_id, recommendations in zip(vectors, ranked):
+            results[user_id] = self._to_event_responses(snapshot, recommendations)
+        
+        for result in results.values():
+            self._record_result(result)
+        return results
+    
+    def get_user_recommendations(self, user_id: int, limit: int = 10,
+                                 include_categories: Optional[List[str]] = None,
+                                 exclude_categories: Optional[List[str]] = None) -> List[EventResponse]:
+        """
+        Get personalized event recommendations for a user, optionally restricted
+        to (or excluding) some categories.
+        """
+        metrics.REQUESTS.inc(kind="single")
+        snapshot = self._ensure_snapshot()
+        if snapshot is None:
+            return self._record_result([])
+        
+        query = (limit, self._normalize_categories(include_categories),
+                 self._normalize_categories(exclude_categories))
+        entry = self._cached_user(snapshot, user_id)
+        if entry is not None and query in entry['results']:
+            return self._record_result(list(entry['results'][query]))
         
         try:
-            # Get and process user interests
-            raw_interests = self.db.get_user_interests(user_id)
-            user_interests = self._process_user_interests(raw_interests)
-            
-            if not user_interests:
-                print(f"❌ No valid interests found for user {user_id}")
-                return []
-            
-            print(f"🔍 User {user_id} interests: '{user_interests}'")
-            
-            # Get all events
-            events = self.db.get_all_events()
-            if not events:
-                print("❌ No events available for recommendations")
-                return []
-            
-            # Prepare event documents and IDs
-            event_documents = []
-            event_ids = []
-            
-            for event in events:
-                title = str(event.get('title', '')).lower()
-                description = str(event.get('description', '')).lower() 
-                category = str(event.get('category_name', '')).lower()
-                
-                doc = f"{title} {description} {category}".strip()
-                if doc:  # Only include non-empty documents
-                    event_documents.append(doc)
-                    event_ids.append(event['id'])
-            
-            if not event_documents:
-                print("❌ No valid event documents found")
-                return []
+            # The stored profile spares the interests lookup and tokenization
+            user_vector = self._user_vector(snapshot, user_id)
+            return self._record_result(self._score_and_cache(snapshot, user_id, user_vector, query, entry))
             
-            print(f"📊 Processing {len(event_documents)} events against user profile")
-            
-            # Get recommendations using TF-IDF engine
-            recommendations = self.engine.get_recommendations(
-                user_profile=user_interests,
-                event_documents=event_documents,
-                event_ids=event_ids,
-                limit=limit
+        except Exception as e:
+            metrics.ERRORS.inc(kind="single")
+            logging.error(f"Recommendation error for user {user_id}: {e}", exc_info=True)
+            return self._record_result([])
+    
+    async def get_user_recommendations_async(self, user_id: int, limit: int = 10,
+                                             include_categories: Optional[List[str]] = None,
+                                             exclude_categories: Optional[List[str]] = None) -> List[EventResponse]:
+        """
+        Async variant of get_user_recommendations for the API.
+        Database lookups and reads of a shared cache run on a thread pool sized
+        to the connection pool and scoring runs on a separate bounded pool, so
+        the event loop never blocks.
+        Identical requests in flight share one computation. Raises
+        ServiceOverloaded when MAX_INFLIGHT_REQUESTS uncached requests are
+        already admitted.
+        """
+        metrics.REQUESTS.inc(kind="single")
+        loop = asyncio.get_running_loop()
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = await loop.run_in_executor(self._db_executor, self._ensure_snapshot)
+            if snapshot is None:
+                return self._record_result([])
+        
+        query = (limit, self._normalize_categories(include_categories),
+                 self._normalize_categories(exclude_categories))
+        if self._cache.blocking:
+            entry = await loop.run_in_executor(self._db_executor, self._cached_user, snapshot, user_id)
+        else:
+            entry = self._cached_user(snapshot, user_id)
+        if entry is not None and query in entry['results']:
+            return self._record_result(list(entry['results'][query]))
+        
+        key = (user_id, query, snapshot.version)
+        task = self._inflight.get(key)
+        if task is None:
+            self._admit("single")
+            task = asyncio.ensure_future(self._recommend_user_async(snapshot, user_id, query, entry))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
+        else:
+            metrics.COALESCED.inc()
+        # Shielded, so a caller that goes away does not cancel the shared work
+        return self._record_result(list(await asyncio.shield(task)))
+    
+    def _admit(self, kind: str):
+        """Count a request against MAX_INFLIGHT_REQUESTS or turn it away."""
+        if MAX_INFLIGHT_REQUESTS and self._admitted >= MAX_INFLIGHT_REQUESTS:
+            metrics.REJECTED.inc(kind=kind)
+            raise ServiceOverloaded(f"{self._admitted} recommendation requests already in flight")
+        self._admitted += 1
+    
+    def _finish_inflight(self, key: Tuple, task: asyncio.Future):
+        self._admitted -= 1
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+    
+    async def _recommend_user_async(self, snapshot: ModelSnapshot, user_id: int, query: Tuple,
+                                    entry: Optional[dict]) -> List[EventResponse]:
+        """Look up, score and cache one user's recommendations off the event loop; errors give []."""
+        loop = asyncio.get_running_loop()
+        try:
+            # The profile store may be remote and a rebuild tokenizes, so neither runs on the loop
+            user_vector = await loop.run_in_executor(
+                self._db_executor, self._user_vector, snapshot, user_id
             )
             
-            # Convert to response format
-            result = []
-            events_dict = {event['id']: event for event in events}
-            
-            for event_id, similarity_score in recommendations:
-                if event_id in events_dict and similarity_score > 0:
-                    event = events_dict[event_id]
-                    result.append(EventResponse(
-                        id=event['id'],
-                        title=event['title'],
-                        description=event['description'],
-                        category_name=event['category_name'],
-                        similarity_score=round(similarity_score, 4)
-                    ))
-            
-            print(f"✅ Generated {len(result)} recommendations for user {user_id}")
-            return result
+            return await loop.run_in_executor(
+                self._scoring_executor, self._score_and_cache, snapshot, user_id, user_vector, query, entry
+            )
             
         except Exception as e:
-            print(f"❌ Error getting recommendations for user {user_id}: {e}")
+            metrics.ERRORS.inc(kind="single")
             logging.error(f"Recommendation error for user {user_id}: {e}", exc_info=True)
             return []
     
-    def refresh_model(self):
-        """Refresh the TF-IDF model with updated events."""
-        print("🔄 Refreshing recommendation model...")
-        self.is_model_fitted = False
-        self._fit_model()
+    def get_batch_user_recommendations(self, user_ids: List[int], limit: int = 10,
+                                       include_categories: Optional[List[str]] = None,
+                                       exclude_categories: Optional[List[str]] = None) -> Dict[int, List[EventResponse]]:
+        """Get recommendations for many users with one interests query, keyed by user id."""
+        metrics.REQUESTS.inc(kind="batch")
+        user_ids = list(dict.fromkeys(user_ids))
+        snapshot = self._ensure_snapshot()
+        if snapshot is None:
+            return {user_id: [] for user_id in user_ids}
         
-    def get_model_stats(self) -> dict:
-        """Get statistics about the current model."""
         try:
-            events = self.db.get_all_events()
-            return {
-                "is_fitted": self.is_model_fitted,
-                "total_events": len(events) if events else 0,
-                "vocabulary_size": len(self.engine.vocabulary) if hasattr(self.engine, 'vocabulary') else 0
-            }
+            user_vectors = self._user_vectors(snapshot, user_ids)
+            return self._score_batch(
+                snapshot, user_ids, user_vectors, limit,
+                self._normalize_categories(include_categories),
+                self._normalize_categories(exclude_categories)
+            )
+            
+        except Exception as e:
+            metrics.ERRORS.inc(kind="batch")
+            logging.error(f"Batch recommendation error: {e}", exc_info=True)
+            return {user_id: [] for user_id in user_ids}
+    
+    async def get_batch_user_recommendations_async(self, user_ids: List[int], limit: int = 10,
+                                                   include_categories: Optional[List[str]] = None,
+                                                   exclude_categories: Optional[List[str]] = None
+                                                   ) -> Dict[int, List[EventResponse]]:
+        """
+        Async variant of get_batch_user_recommendations for the API.
+        Counts as one request against MAX_INFLIGHT_REQUESTS.
+        """
+        metrics.REQUESTS.inc(kind="batch")
+        user_ids = list(dict.fromkeys(user_ids))
+        loop = asyncio.get_running_loop()
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = await loop.run_in_executor(self._db_executor, self._ensure_snapshot)
+            if snapshot is None:
+                return {user_id: [] for user_id in user_ids}
+        
+        self._admit("batch")
+        try:
+            # Profiles missing from the store are read in one query on the database pool
+            user_vectors = await loop.run_in_executor(
+                self._db_executor, self._user_vectors, snapshot, user_ids
+            )
+            return await loop.run_in_executor(
+                self._scoring_executor, self._score_batch, snapshot, user_ids, user_vectors, limit,
+                self._normalize_categories(include_categories),
+                self._normalize_categories(exclude_categories)
+            )
+            
         except Exception as e:
-            return {
-                "is_fitted": self.is_model_fitted,
-                "error": str(e)
-            }
+            metrics.ERRORS.inc(kind="batch")
+            logging.error(f"Batch recommendation error: {e}", exc_info=True)
+            return {user_id: [] for user_id in user_ids}
+        finally:
+            self._admitted -= 1
+    
+    def close(self):
+        """Stop the background refresher and shut down the worker pools and scoring processes."""
+        self.stop_refresher()
+        self._db_executor.shutdown(wait=False, cancel_futures=True)
+        self._scoring_executor.shutdown(wait=False, cancel_futures=True)
+        if self._sharded is not None:
+            self._sharded.close()
+    
+    def refresh_model(self, force: bool = True) -> dict:
+        """
+        Refresh the TF-IDF model with updated events.
+        Without force the refit is skipped when the events watermark matches the
+        last full fit. The current snapshot keeps serving until the new one is
+        published. Returns the refresh status; if a refresh is already running
+        this one is skipped and the running one is reported.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return self.refresh_status()
+        
+        started = time.monotonic()
+        try:
+            with self._status_lock:
+                self._refresh_status.update(state="running", started_at=time.time())
+            
+            error = None
+            try:
+                watermark = self.db.get_events_watermark()
+                if not force and self._snapshot is not None and watermark == self._fitted_watermark:
+                    outcome = "unchanged"
+                else:
+                    logging.info("Refreshing recommendation model...")
+                    outcome = "refreshed" if self._fit_model(watermark) else "failed"
+            except Exception as e:
+                logging.error(f"Model refresh error: {e}", exc_info=True)
+                outcome, error = "failed", str(e)
+            
+            snapshot = self._snapshot
+            with self._status_lock:
+                self._refresh_status.update(
+                    state="idle",
+                    last_outcome=outcome,
+                    last_error=error,
+                    finished_at=time.time(),
+                    duration_seconds=round(time.monotonic() - started, 6),
+                    refreshes=self._refresh_status["refreshes"] + (outcome == "refreshed"),
+                    model_version=snapshot.version if snapshot else None
+                )
+        finally:
+            self._refresh_lock.release()
+        return self.refresh_status()
+    
+    async def refresh_model_async(self, force: bool = True) -> dict:
+        """Async variant of refresh_model for the API; the refit runs on the database pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, self.refresh_model, force)
+    
+    def refresh_status(self) -> dict:
+        """State and outcome of the latest model refresh."""
+        with self._status_lock:
+            return dict(self._refresh_status)
+    
+    def start_refresher(self, interval_seconds: float):
+        """
+        Check for changed events every `interval_seconds` on a background
+        thread and refit when the watermark moved.
+        """
+        if interval_seconds <= 0 or self._refresher is not None:
+            return
+        self._refresher_stop.clear()
+        self._refresher = threading.Thread(
+            target=self._run_refresher, args=(interval_seconds,),
+            name="recommender-refresh", daemon=True
+        )
+        self._refresher.start()
+    
+    def stop_refresher(self):
+        """Stop the background refresher; a refit in progress finishes first."""
+        refresher = self._refresher
+        if refresher is None:
+            return
+        self._refresher_stop.set()
+        refresher.join()
+        self._refresher = None
+    
+    def _run_refresher(self, interval_seconds: float):
+        while not self._refresher_stop.wait(interval_seconds):
+            self.refresh_model(force=False)
+        
+    def get_model_stats(self) -> dict:
+        """Get statistics about the current model from the served snapshot, without querying events."""
+        snapshot = self._snapshot
+        return {
+            "is_fitted": snapshot is not None,
+            "total_events": len(snapshot.event_ids) if snapshot else 0,
+            "vocabulary_size": len(snapshot.engine.vocabulary) if snapshot else 0,
+            "model_version": snapshot.version if snapshot else None,
+            "backend": RECOMMENDER_BACKEND,
+            "ann_probes": ANN_PROBES,
+            "cache": self.cache_stats(),
+            "profiles": self._profiles.stats(),
+        }
+    
+    def _register_metrics(self):
+        """Expose model and cache state that is read at scrape time."""
+        def snapshot_size(size):
+            def read():
+                snapshot = self._snapshot
+                return size(snapshot) if snapshot else 0
+            return read
+        
+        def cache_counter(*keys):
+            def read():
+                stats = self.cache_stats()
+                return {(key,): stats[key] for key in keys if key in stats}
+            return read
+        
+        for metric in (
+            metrics.CallbackMetric(
+                "recommender_corpus_size", "Events in the served model.",
+                snapshot_size(lambda snapshot: len(snapshot.event_ids))),
+            metrics.CallbackMetric(
+                "recommender_vocabulary_size", "Terms in the served model.",
+                snapshot_size(lambda snapshot: len(snapshot.engine.vocabulary))),
+            metrics.CallbackMetric(
+                "recommender_cache_lookups_total", "Recommendation cache lookups by result.",
+                cache_counter("hits", "misses"), type_name="counter", labelnames=("result",)),
+            metrics.CallbackMetric(
+                "recommender_cache_evictions_total", "Recommendation cache entries dropped early.",
+                cache_counter("evictions", "expirations"), type_name="counter", labelnames=("reason",)),
+            metrics.CallbackMetric(
+                "recommender_inflight_requests", "Uncached requests admitted and not yet finished.",
+                lambda: self._admitted),
+            metrics.CallbackMetric(
+                "recommender_cache_entries", "Entries held by the in-process recommendation cache.",
+                lambda: self.cache_stats().get("entries")),
+        ):
+            metrics.REGISTRY.register(metric, replace=True)
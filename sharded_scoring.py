@@ -0,0 +1,190 @@
+"""
+Multi-process scoring of a fitted corpus split into contiguous row shards.
+
+ShardedScorer writes each model version once as a model_store artifact and
+owns one single-process pool per shard. Every worker memory-maps the
+artifact and wraps only its own rows in a CSRCorpus, so the corpus is never
+pickled and workers share the page cache. A query sends the user vectors to
+every shard, each shard returns its local top k, and the parent merges them.
+"""
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from csr_backend import CSRCorpus, np, sparse, is_available
+from model_store import save_model, MANIFEST_FILE
+
+# Shard held by this worker process: (artifact path, CSRCorpus of its rows,
+# first row, category -> code, category code per row)
+_loaded = None
+
+
+def shard_bounds(num_documents: int, index: int, count: int) -> Tuple[int, int]:
+    """Row range [start, stop) of shard `index` out of `count` near-equal shards."""
+    return num_documents * index // count, num_documents * (index + 1) // count
+
+
+def _load_shard(path: str, index: int, count: int):
+    """Memory-map the artifact at `path` and keep this worker's rows; the last version stays loaded."""
+    global _loaded
+    if _loaded is not None and _loaded[0] == path:
+        return _loaded
+
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    terms = manifest["terms"]
+    data = np.load(os.path.join(path, "matrix_data.npy"), mmap_mode="r")
+    indices = np.load(os.path.join(path, "matrix_indices.npy"), mmap_mode="r")
+    indptr = np.load(os.path.join(path, "matrix_indptr.npy"), mmap_mode="r")
+    codes = np.load(os.path.join(path, "category_codes.npy"), mmap_mode="r")
+
+    start, stop = shard_bounds(indptr.shape[0] - 1, index, count)
+    first, last = int(indptr[start]), int(indptr[stop])
+    # Slices of the memory-mapped arrays are views; only the row pointers are copied
+    matrix = sparse.csr_matrix(
+        (data[first:last], indices[first:last], np.asarray(indptr[start:stop + 1]) - first),
+        shape=(stop - start, len(terms))
+    )
+    corpus = CSRCorpus.from_matrices({term: column for column, term in enumerate(terms)}, matrix, matrix.T.tocsr())
+    category_codes = {category: code for code, category in enumerate(manifest["categories"])}
+    _loaded = (path, corpus, start, category_codes, codes[start:stop])
+    return _loaded
+
+
+def _score_shard(path: str, index: int, count: int, user_vectors: List[Dict[str, float]], limit: int,
+                 categories: Optional[List[str]]) -> List[List[Tuple[int, float]]]:
+    """Local top k of one shard, as (global row, score) lists ordered by score and then row."""
+    _, corpus, start, category_codes, codes = _load_shard(path, index, count)
+    rows = None
+    if categories is not None:
+        selected = [category_codes[category] for category in categories if category in category_codes]
+        rows = np.flatnonzero(np.isin(codes, selected))
+    return [
+        [(start + position, score) for position, score in ranked]
+        for ranked in corpus.top_k(user_vectors, limit, rows)
+    ]
+
+
+class ShardedCorpus:
+    """
+    One exported model version scored by a ShardedScorer. Passed to the
+    engine's rank_vector/get_batch_recommendations as `shards`.
+    """
+
+    def __init__(self, scorer: "ShardedScorer", path: str, event_ids: Sequence[int]):
+        self._scorer = scorer
+        self.path = path
+        self.event_ids = event_ids
+
+    def top_k(self, user_vectors: List[Dict[str, float]], limit: int,
+              categories: Optional[List[str]] = None,
+              timings: Optional[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Score user vectors on every shard in parallel and merge the local
+        results. Returns (event_id, score) lists in the engine's ranking order.
+        """
+        if not user_vectors or limit <= 0:
+            return [[] for _ in user_vectors]
+
+        started = time.perf_counter()
+        count = len(self._scorer.executors)
+        futures = [
+            executor.submit(_score_shard, self.path, index, count, user_vectors, limit, categories)
+            for index, executor in enumerate(self._scorer.executors)
+        ]
+        shard_results = [future.result() for future in futures]
+        scored = time.perf_counter()
+
+        merged = []
+        event_ids = self.event_ids
+        for per_user in zip(*shard_results):
+            candidates = (item for ranked in per_user for item in ranked)
+            top = heapq.nsmallest(limit, candidates, key=lambda item: (-item[1], item[0]))
+            merged.append([(event_ids[position], score) for position, score in top])
+
+        if timings is not None:
+            timings['scoring'] = timings.get('scoring', 0.0) + scored - started
+            timings['top_k'] = timings.get('top_k', 0.0) + time.perf_counter() - scored
+        return merged
+
+
+class ShardedScorer:
+    """
+    Process pool with one worker per shard. A model version is exported in
+    the background once it has been requested for `min_age_seconds`; until
+    its export is ready, corpus_for() returns None and callers score in-process.
+    """
+
+    def __init__(self, processes: int, directory: str, min_age_seconds: float = 0.0):
+        if not is_available():
+            raise ImportError("Sharded scoring requires numpy and scipy to be installed")
+
+        self.directory = directory
+        self.min_age_seconds = min_age_seconds
+        # Workers start clean instead of forking the parent's threads and locks
+        context = multiprocessing.get_context("spawn")
+        self.executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(processes)
+        ]
+        self._lock = threading.Lock()
+        # version -> artifact path, oldest first; the previous version is kept for requests in flight
+        self._exports: Dict[str, str] = {}
+        self._exporting: Optional[str] = None
+        # Version whose export failed; it is scored in-process rather than retried
+        self._failed: Optional[str] = None
+        # (version, monotonic time of its first request); versions replaced sooner are never exported
+        self._candidate: Optional[Tuple[str, float]] = None
+
+    def corpus_for(self, engine, version: str, event_ids: Sequence[int]) -> Optional[ShardedCorpus]:
+        """
+        Return the sharded corpus of `version`, starting its export once the
+        version has stayed current for min_age_seconds.
+        """
+        with self._lock:
+            path = self._exports.get(version)
+            if path is not None:
+                return ShardedCorpus(self, path, event_ids)
+            now = time.monotonic()
+            if self._candidate is None or self._candidate[0] != version:
+                self._candidate = (version, now)
+            if (self._exporting is None and self._failed != version
+                    and now - self._candidate[1] >= self.min_age_seconds):
+                self._exporting = version
+                threading.Thread(
+                    target=self._export, args=(engine, version),
+                    name="recommender-shard-export", daemon=True
+                ).start()
+        return None
+
+    def _export(self, engine, version: str):
+        try:
+            path = save_model(self.directory, engine, [], version)
+        except Exception as e:
+            logging.error(f"Sharded corpus export failed: {e}", exc_info=True)
+            with self._lock:
+                self._exporting = None
+                self._failed = version
+            return
+
+        with self._lock:
+            self._exports[version] = path
+            self._exporting = None
+            stale = list(self._exports)[:-2]
+            for old_version in stale:
+                shutil.rmtree(self._exports.pop(old_version), ignore_errors=True)
+        logging.info(f"Sharded corpus ready for {len(self.executors)} scoring processes")
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for path in self._exports.values():
+                shutil.rmtree(path, ignore_errors=True)
+            self._exports.clear()
@@ -0,0 +1,69 @@
+"""Recall and result counts of approximate (IVF) retrieval, with and without filters."""
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from ann_index import _assign
+from benchmarks.synthetic import SyntheticCatalog
+from recommendation_engine import TFIDFRecommendationEngine
+
+PROBES = 4
+LIMIT = 10
+
+FILTERS = [
+    None,
+    ["music"],
+    ["technology", "food"],
+    ["music", "sports", "art"],
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    synthetic = SyntheticCatalog(seed=13)
+    engine = TFIDFRecommendationEngine(backend="csr", ann_probes=PROBES)
+    engine.fit_records(
+        (event["id"], f"{event['title']} {event['description']}", event["category_name"])
+        for event in synthetic.events(5000)
+    )
+    vectors = [engine.vectorize_profile(profile) for profile in synthetic.users(40).values()]
+    return engine, vectors
+
+
+def recall(engine, vectors, include):
+    approximate = engine.rank_vectors(vectors, LIMIT, include)
+    exact_engine = engine.copy()
+    exact_engine.ann_probes = 0
+    exact = exact_engine.rank_vectors(vectors, LIMIT, include)
+    found = sum(
+        len({event_id for event_id, _ in expected} & {event_id for event_id, _ in actual})
+        for expected, actual in zip(exact, approximate)
+    )
+    return found / sum(len(expected) for expected in exact)
+
+
+@pytest.mark.parametrize("include", FILTERS)
+def test_filtered_queries_return_full_results(catalog, include):
+    engine, vectors = catalog
+    for ranked in engine.rank_vectors(vectors, LIMIT, include):
+        assert len(ranked) == LIMIT
+        if include is not None:
+            assert {engine.categories[event_id] for event_id, _ in ranked} <= set(include)
+
+
+@pytest.mark.parametrize("include", FILTERS[1:])
+def test_filters_do_not_lower_recall(catalog, include):
+    engine, vectors = catalog
+    assert recall(engine, vectors, include) >= 0.9 * recall(engine, vectors, None)
+
+
+def test_incremental_updates_assign_like_a_full_rebuild(catalog):
+    engine, vectors = catalog
+    engine = engine.copy()
+    engine.add_document(10 ** 6, "jazz saxophone quartet evening", "music")
+    engine.update_document(5, "chess club tournament", "art")
+    engine.remove_document(6)
+    engine.add_documents([(10 ** 6 + 1, "late jazz session", "music"), (7, "robotics workshop", None)])
+    index = engine._ensure_ann(engine._ensure_csr())
+    assert np.array_equal(index.assignment, _assign(index.matrix, index.centroids_t))
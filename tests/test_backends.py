@@ -0,0 +1,121 @@
+"""Parity of the python and csr scoring backends on a small seeded catalog."""
+import statistics
+import time
+
+import pytest
+
+pytest.importorskip("scipy")
+
+from benchmarks.synthetic import SyntheticCatalog
+from recommendation_engine import TFIDFRecommendationEngine
+
+# Weights are stored as float32, so the backends agree to about this much
+SCORE_TOLERANCE = 1e-6
+
+FILTERS = [
+    ((), ()),
+    (("music",), ()),
+    (("music", "sports", "art"), ()),
+    ((), ("technology", "food")),
+    (("music", "sports"), ("sports",)),
+    (("no-such-category",), ()),
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    synthetic = SyntheticCatalog(seed=7, vocabulary_size=2000)
+    events = synthetic.events(1500)
+    profiles = list(synthetic.users(60).values())
+    engines = {}
+    for backend in ("python", "csr"):
+        engine = TFIDFRecommendationEngine(backend=backend)
+        engine.fit_records(
+            (event["id"], f"{event['title']} {event['description']}", event["category_name"])
+            for event in events
+        )
+        engines[backend] = engine
+    return engines, profiles
+
+
+def assert_same_rankings(expected, actual):
+    assert len(expected) == len(actual)
+    for python_ranked, csr_ranked in zip(expected, actual):
+        assert [event_id for event_id, _ in python_ranked] == [event_id for event_id, _ in csr_ranked]
+        for (_, python_score), (_, csr_score) in zip(python_ranked, csr_ranked):
+            assert python_score == pytest.approx(csr_score, abs=SCORE_TOLERANCE)
+
+
+@pytest.mark.parametrize("include,exclude", FILTERS)
+def test_batch_rankings_match(catalog, include, exclude):
+    engines, profiles = catalog
+    expected = engines["python"].get_batch_recommendations(profiles, 10, list(include), list(exclude))
+    actual = engines["csr"].get_batch_recommendations(profiles, 10, list(include), list(exclude))
+    assert_same_rankings(expected, actual)
+
+
+@pytest.mark.parametrize("include,exclude", FILTERS)
+def test_single_rankings_match(catalog, include, exclude):
+    engines, profiles = catalog
+    for profile in profiles[:10]:
+        expected = engines["python"].get_indexed_recommendations(profile, 10, list(include), list(exclude))
+        actual = engines["csr"].get_indexed_recommendations(profile, 10, list(include), list(exclude))
+        assert_same_rankings([expected], [actual])
+
+
+def test_filtered_results_stay_in_their_categories(catalog):
+    engines, profiles = catalog
+    for backend, engine in engines.items():
+        for ranked in engine.get_batch_recommendations(profiles, 10, ["music", "sports"]):
+            assert {engine.categories[event_id] for event_id, _ in ranked} <= {"music", "sports"}
+
+
+@pytest.mark.parametrize("include,exclude", FILTERS)
+def test_zero_score_padding_matches(catalog, include, exclude):
+    engines, _ = catalog
+    # Nothing in the corpus matches, so every result is padding in corpus order
+    profiles = ["unmatchedterm", "technology unmatchedterm"]
+    expected = engines["python"].get_batch_recommendations(profiles, 25, list(include), list(exclude))
+    actual = engines["csr"].get_batch_recommendations(profiles, 25, list(include), list(exclude))
+    assert_same_rankings(expected, actual)
+
+
+def test_rankings_match_after_incremental_updates(catalog):
+    engines, profiles = catalog
+    updated = {}
+    for backend, engine in engines.items():
+        engine = engine.copy()
+        engine.add_document(10 ** 6, "jazz saxophone quartet evening", "music")
+        engine.update_document(5, "moved to another category", "art")
+        engine.remove_document(6)
+        engine.add_documents([(10 ** 6 + 1, "late jazz session", "music"), (7, "chess club", None)])
+        updated[backend] = engine
+    for include, exclude in FILTERS:
+        expected = updated["python"].get_batch_recommendations(profiles + ["jazz"], 30, list(include), list(exclude))
+        actual = updated["csr"].get_batch_recommendations(profiles + ["jazz"], 30, list(include), list(exclude))
+        assert_same_rankings(expected, actual)
+
+
+def test_filtered_query_costs_no_more_than_unfiltered():
+    synthetic = SyntheticCatalog(seed=11)
+    engine = TFIDFRecommendationEngine(backend="csr")
+    engine.fit_records(
+        (event["id"], f"{event['title']} {event['description']}", event["category_name"])
+        for event in synthetic.events(20000)
+    )
+    profiles = list(synthetic.users(10).values())
+    categories = sorted(set(engine.categories.values()))
+
+    def latency(include):
+        runs = []
+        for _ in range(7):
+            started = time.perf_counter()
+            engine.get_batch_recommendations(profiles, 10, include)
+            runs.append(time.perf_counter() - started)
+        return statistics.median(runs)
+
+    unfiltered = latency(None)
+    # Generous margin so scheduler noise does not fail the check; the
+    # regression it guards against made wide filters several times slower
+    for include in (categories[:1], categories[:len(categories) // 2]):
+        assert latency(include) <= 1.5 * unfiltered
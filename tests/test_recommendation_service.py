@@ -0,0 +1,115 @@
+"""Single-flight and admission control of the async recommendation path."""
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import recommendation_service
+from benchmarks.synthetic import InMemoryDatabase, SyntheticCatalog
+from recommendation_service import RecommendationService, ServiceOverloaded
+
+# Seconds a blocked computation waits before giving up, so a failing test cannot hang
+RELEASE_TIMEOUT = 10
+
+
+@pytest.fixture
+def service():
+    synthetic = SyntheticCatalog(seed=5, vocabulary_size=500)
+    users = synthetic.users(20)
+    service = RecommendationService(db=InMemoryDatabase(synthetic.events(300), users))
+    service.user_ids = list(users)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def blocked(service, monkeypatch):
+    """Hold every user lookup until the returned event is set, counting the lookups."""
+    release = threading.Event()
+    lookups = []
+    user_vector = service._user_vector
+
+    def blocked_user_vector(snapshot, user_id):
+        lookups.append(user_id)
+        release.wait(RELEASE_TIMEOUT)
+        return user_vector(snapshot, user_id)
+
+    monkeypatch.setattr(service, "_user_vector", blocked_user_vector)
+    release.lookups = lookups
+    yield release
+    release.set()
+
+
+def assert_idle(service):
+    assert service._admitted == 0
+    assert service._inflight == {}
+
+
+def test_identical_concurrent_requests_share_one_computation(service, blocked):
+    user_id = service.user_ids[0]
+
+    async def run():
+        requests = [
+            asyncio.ensure_future(service.get_user_recommendations_async(user_id, 5, ["music"]))
+            for _ in range(20)
+        ]
+        await asyncio.sleep(0)
+        assert service._admitted == 1
+        blocked.set()
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(run())
+    assert blocked.lookups == [user_id]
+    assert all(result == results[0] for result in results)
+    assert_idle(service)
+
+
+def test_admission_is_released_after_success(service):
+    asyncio.run(service.get_user_recommendations_async(service.user_ids[0], 5))
+    asyncio.run(service.get_batch_user_recommendations_async(service.user_ids[:3], 5))
+    assert_idle(service)
+
+
+def test_admission_is_released_after_errors(service, monkeypatch):
+    def failing_user_vector(snapshot, user_id):
+        raise RuntimeError("profile store unavailable")
+
+    def failing_user_vectors(snapshot, user_ids):
+        raise RuntimeError("profile store unavailable")
+
+    monkeypatch.setattr(service, "_user_vector", failing_user_vector)
+    monkeypatch.setattr(service, "_user_vectors", failing_user_vectors)
+    assert asyncio.run(service.get_user_recommendations_async(service.user_ids[0], 5)) == []
+    batch = asyncio.run(service.get_batch_user_recommendations_async(service.user_ids[:3], 5))
+    assert batch == {user_id: [] for user_id in service.user_ids[:3]}
+    assert_idle(service)
+
+
+def test_excess_distinct_requests_are_rejected(service, blocked, monkeypatch):
+    monkeypatch.setattr(recommendation_service, "MAX_INFLIGHT_REQUESTS", 2)
+    first, second, third = service.user_ids[:3]
+
+    async def run():
+        admitted = [
+            asyncio.ensure_future(service.get_user_recommendations_async(user_id, 5))
+            for user_id in (first, second)
+        ]
+        await asyncio.sleep(0)
+        with pytest.raises(ServiceOverloaded):
+            await service.get_user_recommendations_async(third, 5)
+        with pytest.raises(ServiceOverloaded):
+            await service.get_batch_user_recommendations_async([third], 5)
+        # A request identical to one in flight joins it instead of being turned away
+        joined = asyncio.ensure_future(service.get_user_recommendations_async(first, 5))
+        await asyncio.sleep(0)
+        assert service._admitted == 2
+        blocked.set()
+        return await asyncio.gather(*admitted, joined)
+
+    first_result, _, joined_result = asyncio.run(run())
+    assert joined_result == first_result
+    assert sorted(blocked.lookups) == sorted([first, second])
+    assert_idle(service)
@@ -0,0 +1,53 @@
+"""Sharded scoring returns the same rankings as in-process csr scoring."""
+import time
+
+import pytest
+
+pytest.importorskip("scipy")
+
+from benchmarks.synthetic import SyntheticCatalog
+from recommendation_engine import TFIDFRecommendationEngine
+from sharded_scoring import ShardedScorer
+
+FILTERS = [
+    ((), ()),
+    (("music",), ()),
+    (("music", "sports", "art"), ()),
+    ((), ("technology", "food")),
+    (("no-such-category",), ()),
+]
+
+# Seconds to wait for the background export and the spawned workers
+EXPORT_TIMEOUT = 60
+
+
+@pytest.fixture(scope="module")
+def sharded(tmp_path_factory):
+    synthetic = SyntheticCatalog(seed=3, vocabulary_size=2000)
+    engine = TFIDFRecommendationEngine(backend="csr")
+    engine.fit_records(
+        (event["id"], f"{event['title']} {event['description']}", event["category_name"])
+        for event in synthetic.events(2000)
+    )
+    profiles = list(synthetic.users(30).values())
+
+    scorer = ShardedScorer(3, str(tmp_path_factory.mktemp("shards")))
+    event_ids = tuple(engine.event_ids)
+    deadline = time.monotonic() + EXPORT_TIMEOUT
+    while (shards := scorer.corpus_for(engine, "v1", event_ids)) is None:
+        assert time.monotonic() < deadline, "sharded export did not finish"
+        time.sleep(0.05)
+    yield engine, shards, profiles
+    scorer.close()
+
+
+@pytest.mark.parametrize("include,exclude", FILTERS)
+def test_sharded_rankings_match_in_process(sharded, include, exclude):
+    engine, shards, profiles = sharded
+    expected = engine.get_batch_recommendations(profiles, 10, list(include), list(exclude))
+    actual = engine.get_batch_recommendations(profiles, 10, list(include), list(exclude), shards=shards)
+    assert len(expected) == len(actual)
+    for in_process, across_shards in zip(expected, actual):
+        assert [event_id for event_id, _ in in_process] == [event_id for event_id, _ in across_shards]
+        for (_, in_process_score), (_, shard_score) in zip(in_process, across_shards):
+            assert in_process_score == pytest.approx(shard_score, abs=1e-9)
@@ -1,22 +1,45 @@
 import re
 import math
-from typing import List, Dict, Set
+from functools import lru_cache
+from typing import List, Dict, Set, Tuple, Iterable, Iterator
 from collections import Counter
 
+# Common English stop words
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 
+    'from', 'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 
+    'that', 'the', 'to', 'was', 'will', 'with', 'the', 'this',
+    'but', 'they', 'have', 'had', 'what', 'said', 'each', 'which',
+    'do', 'how', 'their', 'if', 'up', 'out', 'many', 'then', 'them',
+    'or', 'so', 'can', 'all', 'any', 'get', 'use', 'now', 'way',
+    'may', 'say', 'come', 'could', 'see', 'time', 'very', 'when',
+    'much', 'go', 'well', 'little', 'good', 'make', 'world', 'over',
+    'think', 'also', 'back', 'after', 'first', 'work', 'life'
+})
+
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+# Distinct short texts (user profiles, queries) whose tokens are remembered
+TOKEN_CACHE_SIZE = 4096
+
+
+def _tokenize(text: str) -> List[str]:
+    # Convert to lowercase, remove punctuation and tokenize by splitting on whitespace.
+    # Remove stop words, short tokens (less than 3 characters) and non-alphabetic tokens.
+    return [
+        token for token in PUNCTUATION_PATTERN.sub(' ', text.lower()).split()
+        if len(token) > 2 and token.isalpha() and token not in STOP_WORDS
+    ]
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _tokenize_cached(text: str) -> Tuple[str, ...]:
+    return tuple(_tokenize(text))
+
+
 class TextProcessor:
     def __init__(self):
-        # Common English stop words
-        self.stop_words = {
-            'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 
-            'from', 'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 
-            'that', 'the', 'to', 'was', 'will', 'with', 'the', 'this',
-            'but', 'they', 'have', 'had', 'what', 'said', 'each', 'which',
-            'do', 'how', 'their', 'if', 'up', 'out', 'many', 'then', 'them',
-            'or', 'so', 'can', 'all', 'any', 'get', 'use', 'now', 'way',
-            'may', 'say', 'come', 'could', 'see', 'time', 'very', 'when',
-            'much', 'go', 'well', 'little', 'good', 'make', 'world', 'over',
-            'think', 'also', 'back', 'after', 'first', 'work', 'life'
-        }
+        self.stop_words = STOP_WORDS
     
     def preprocess_text(self, text: str) -> List[str]:
         """
@@ -25,41 +48,44 @@ class TextProcessor:
         """
         if not text:
             return []
-        
-        # Convert to lowercase and remove punctuation
-        text = re.sub(r'[^\w\s]', ' ', text.lower())
-        
-        # Tokenize by splitting on whitespace
-        tokens = text.split()
-        
-        # Remove stop words and short tokens (less than 3 characters)
-        filtered_tokens = []
-        for token in tokens:
-            if (token not in self.stop_words and 
-                len(token) > 2 and 
-                token.isalpha()):  # Only keep alphabetic tokens
-                filtered_tokens.append(token)
-        
-        return filtered_tokens
+        return list(_tokenize_cached(text))
+    
+    def tokenize(self, document: str) -> List[str]:
+        """Tokenize one corpus document, bypassing the memo cache."""
+        return _tokenize(document) if document else []
+    
+    def iter_tokenized(self, documents: Iterable[str]) -> Iterator[List[str]]:
+        """
+        Tokenize documents one at a time for single-pass consumers.
+        Corpus documents are mostly distinct, so they bypass the memo cache.
+        """
+        for doc in documents:
+            yield self.tokenize(doc)
+    
+    def tokenize_documents(self, documents: Iterable[str]) -> List[List[str]]:
+        """Tokenize every document once so several passes can reuse the tokens."""
+        return list(self.iter_tokenized(documents))
     
     def get_vocabulary(self, documents: List[str]) -> Set[str]:
         """Get unique vocabulary from all documents."""
-        vocab = set()
-        for doc in documents:
-            if doc:  # Check if document is not empty
-                tokens = self.preprocess_text(doc)
-                vocab.update(tokens)
-        return vocab
+        return self.vocabulary_from_tokens(self.iter_tokenized(documents))
     
     def get_document_frequency(self, documents: List[str]) -> Dict[str, int]:
         """Get document frequency for each term in the vocabulary."""
-        doc_freq = {}
-        vocab = self.get_vocabulary(documents)
-        
-        for term in vocab:
-            doc_freq[term] = 0
-            for doc in documents:
-                if doc and term in self.preprocess_text(doc):
-                    doc_freq[term] += 1
-                    
-        return doc_freq
+        return self.document_frequency_from_tokens(self.iter_tokenized(documents))
+    
+    @staticmethod
+    def vocabulary_from_tokens(token_lists: Iterable[Iterable[str]]) -> Set[str]:
+        """Get unique vocabulary from pre-tokenized documents."""
+        vocab = set()
+        for tokens in token_lists:
+            vocab.update(tokens)
+        return vocab
+    
+    @staticmethod
+    def document_frequency_from_tokens(token_lists: Iterable[Iterable[str]]) -> Dict[str, int]:
+        """Count the documents containing each term in a single pass over pre-tokenized documents."""
+        doc_freq = Counter()
+        for tokens in token_lists:
+            doc_freq.update(set(tokens))
+        return dict(doc_freq)